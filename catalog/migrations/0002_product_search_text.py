@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-17 22:04
+
+from django.db import migrations, models
+
+from catalog.models import normalize_search_text
+
+
+def fill_search_text(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    batch = []
+    for p in Product.objects.only("id", "name", "sku", "barcode").iterator(chunk_size=1000):
+        p.search_text = normalize_search_text(p.name, p.sku, p.barcode)
+        batch.append(p)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, ["search_text"])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ["search_text"])
+
+
+def create_trgm_index(apps, schema_editor):
+    # faqat Postgres: LIKE '%...%' uchun trigram GIN indeks (SQLite'da oddiy scan)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS catalog_product_search_trgm "
+        "ON catalog_product USING gin (search_text gin_trgm_ops)"
+    )
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS catalog_product_search_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.CharField(default='', editable=False, max_length=400),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
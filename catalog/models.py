@@ -47,6 +47,16 @@ def _next_product_sku() -> str:
     seq.save(update_fields=["last"])
     return f"P{seq.last:06d}"  # P000001
 
+# o'zbekcha tutuq belgisi (o‘, oʻ, o', o`) qidiruvda tashlab yuboriladi: "go'sht" == "gosht"
+_APOSTROPHES = str.maketrans("", "", "'‘’ʻʼ`´")
+
+
+def normalize_search_text(*parts) -> str:
+    """Qidiruv uchun: kichik harf, tutuq belgilarisiz, bo'shliqlar bitta."""
+    text = " ".join(str(p) for p in parts if p)
+    return " ".join(text.translate(_APOSTROPHES).casefold().split())
+
+
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255, unique=True)
@@ -56,9 +66,18 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # name + sku + barcode normallashtirilgan (catalog.services.search_products).
+    # Postgres'da pg_trgm GIN indeks bor (migration 0002_product_search_text).
+    search_text = models.CharField(max_length=400, default="", editable=False)
+
     def __str__(self) -> str:
         return self.name
 
+    def _fill_search_text(self, kwargs) -> None:
+        self.search_text = normalize_search_text(self.name, self.sku, self.barcode)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = list(set(kwargs["update_fields"]) | {"search_text"})
+
     def save(self, *args, **kwargs):
         # SKU bo'sh bo'lsa avtomatik beramiz
         if not self.sku:
@@ -71,8 +90,10 @@ class Product(models.Model):
                     uf.add("sku")
                     kwargs["update_fields"] = list(uf)
 
+                self._fill_search_text(kwargs)
                 return super().save(*args, **kwargs)
 
+        self._fill_search_text(kwargs)
         return super().save(*args, **kwargs)
     class Meta:
         verbose_name = "Mahsulot"
@@ -0,0 +1,43 @@
+# catalog/services.py
+"""
+Mahsulot qidiruvi.
+
+  - aniq shtrix-kod / SKU — mavjud unique indekslar orqali bitta qator (skaner uchun)
+  - qolgani — Product.search_text bo'yicha har bir so'z uchun LIKE '%so'z%';
+    Postgres'da pg_trgm GIN indeks ishlatiladi, SQLite'da (testlar) oddiy scan.
+"""
+from __future__ import annotations
+
+from django.db.models import Q
+
+from .models import Product, normalize_search_text
+
+
+def find_product_by_code(code: str) -> Product | None:
+    """Aniq barcode yoki SKU bo'yicha (unique indekslar). Topilmasa None."""
+    code = (code or "").strip()
+    if not code:
+        return None
+    return Product.objects.filter(Q(barcode=code) | Q(sku=code)).first()
+
+
+def product_search_q(query: str, *, prefix: str = "") -> Q:
+    """
+    Qidiruv sharti: har bir so'z search_text ichida bo'lishi kerak.
+    prefix — boshqa modeldan filtrlash uchun, masalan "product__".
+    """
+    q = Q()
+    for word in normalize_search_text(query).split():
+        q &= Q(**{f"{prefix}search_text__contains": word})
+    return q
+
+
+def search_products(qs, query: str, *, prefix: str = ""):
+    """
+    qs'ni qidiruv bo'yicha filtrlaydi. So'rov aniq barcode/SKU bo'lsa faqat o'sha mahsulot
+    qaytadi (LIKE qidiruvisiz).
+    """
+    hit = find_product_by_code(query)
+    if hit is not None:
+        return qs.filter(**{f"{prefix}pk": hit.pk})
+    return qs.filter(product_search_q(query, prefix=prefix))
@@ -133,6 +133,26 @@ DATABASES = {
 }
 
 
+# Umumiy kesh: BOM, menu snapshot, sellable va ularning versiya hisoblagichlari barcha
+# gunicorn worker'lari va run_stock_worker uchun bitta bo'lishi shart (LocMem har process'da alohida).
+# REDIS_URL berilmasa — DB kesh (`python manage.py createcachetable`).
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        }
+    }
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -163,6 +183,23 @@ TIME_ZONE = 'Asia/Tashkent'
 USE_I18N = True
 
 USE_TZ = True
+
+# Biznes kun chegarasi (Z-report): shu vaqtgacha bo'lgan tranzaksiyalar oldingi kunga yoziladi
+BUSINESS_DAY_CUTOFF = os.getenv("BUSINESS_DAY_CUTOFF", "04:00")
+
+# Order stock yechish rejimi:
+#   "lock"        — BranchProduct'lar select_for_update bilan o'qiladi, keyin bulk_update
+#   "conditional" — har bir mahsulot uchun UPDATE ... WHERE stock_qty >= x (o'qishsiz)
+STOCK_CONSUMPTION_MODE = os.getenv("STOCK_CONSUMPTION_MODE", "lock")
+
+# True bo'lsa mark_delivered stockni o'zi yechmaydi — StockApplyJob navbatiga qo'yadi,
+# `run_stock_worker` jarayoni partiyalab yechadi (cogs/profit ham o'sha yerda yoziladi).
+STOCK_APPLY_DEFERRED = os.getenv("STOCK_APPLY_DEFERRED", "0").lower() in ("1", "true", "yes", "on")
+
+# Qoldiq prognozi (`compute_stock_forecasts`, har kecha): necha kunlik sotuv bo'yicha
+# o'rtacha sarf olinadi va buyurtma necha kunlik zaxiraga yetadigan qilib tavsiya qilinadi.
+STOCK_FORECAST_WINDOW_DAYS = int(os.getenv("STOCK_FORECAST_WINDOW_DAYS", "28"))
+STOCK_REORDER_COVER_DAYS = int(os.getenv("STOCK_REORDER_COVER_DAYS", "7"))
 LANGUAGES = [
     ("uz", "O'zbekcha")
 ]
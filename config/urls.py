@@ -19,6 +19,9 @@ urlpatterns = [
 
     # POS (Sales UI)
     path("pos/", include("sales.urls")),
+
+    # Moliya (kassa ko'chirmasi)
+    path("finance/", include("finance.urls")),
 ]
 
 if settings.DEBUG:
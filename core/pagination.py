@@ -0,0 +1,77 @@
+# core/pagination.py
+"""
+Keyset (cursor) pagination: OFFSET o'rniga oxirgi qatorning kaliti bo'yicha.
+
+Kalit — (asosiy maydon, id) juftligi, masalan (created_at, id). Cursor shu
+ikki qiymatning base64 ko'rinishi; Django maydonlari string qiymatni o'zi
+parse qiladi (datetime/UUID/Decimal).
+"""
+from __future__ import annotations
+
+import base64
+import json
+from functools import reduce
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def page_size(raw, *, default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    try:
+        n = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(n, maximum))
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else str(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Noto'g'ri cursor bo'lsa ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError("cursor noto'g'ri")
+    if not isinstance(values, list):
+        raise ValueError("cursor noto'g'ri")
+    return values
+
+
+def _attr(obj, path: str):
+    for part in path.split("__"):
+        obj = obj[part] if isinstance(obj, dict) else getattr(obj, part)
+    return obj
+
+
+def keyset_page(qs, *, cursor: str | None, limit: int, keys=("created_at", "id"), desc: bool = True):
+    """
+    (rows, next_cursor) qaytaradi. next_cursor=None — oxirgi sahifa.
+
+    WHERE (k1 < v1) OR (k1 = v1 AND k2 < v2) ... ORDER BY k1 DESC, k2 DESC
+    — (branch, ..., created_at) kabi indekslar bilan OFFSET'siz ishlaydi.
+    """
+    op = "lt" if desc else "gt"
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError("cursor noto'g'ri")
+        conds = []
+        for i, key in enumerate(keys):
+            eq = {k: v for k, v in zip(keys[:i], values[:i])}
+            conds.append(Q(**eq, **{f"{key}__{op}": values[i]}))
+        qs = qs.filter(reduce(lambda a, b: a | b, conds))
+
+    qs = qs.order_by(*[f"-{k}" if desc else k for k in keys])
+    rows = list(qs[: limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([_attr(rows[-1], k) for k in keys])
+    return rows, next_cursor
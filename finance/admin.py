@@ -1,9 +1,11 @@
 # finance/admin.py
 from django.contrib import admin, messages
 from django.core.exceptions import PermissionDenied
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
-from .models import MoneyAccount, CashTransaction
+from .models import AccountBalanceCheckpoint, DailyAccountClose, MoneyAccount, CashTransaction
 from users.models import StaffRole
 
 def _is_owner(user):
@@ -55,7 +57,7 @@ class CashTransactionInline(admin.TabularInline):
 
 @admin.register(MoneyAccount)
 class MoneyAccountAdmin(admin.ModelAdmin):
-    list_display = ("branch", "name", "kind", "balance_cache", "is_active")
+    list_display = ("branch", "name", "kind", "balance_display", "is_active")
     list_filter = ("branch", "kind", "is_active")
     search_fields = ("branch__name", "name")
     ordering = ("branch__name", "name")
@@ -66,10 +68,10 @@ class MoneyAccountAdmin(admin.ModelAdmin):
     inlines = (CashTransactionInline,)
 
     # balance_cache qo'lda o'zgarmasin (ledger bilan farq chiqib ketadi)
-    readonly_fields = ("balance_cache",)
+    readonly_fields = ("balance_cache", "balance_display")
 
     # (ixtiyoriy) formada qaysi fieldlar ko'rinsin:
-    fields = ("branch", "name", "kind", "is_active", "balance_cache")
+    fields = ("branch", "name", "kind", "is_active", "balance_stripes", "balance_cache", "balance_display")
 
     # (ixtiyoriy) kind sizga kerak bo'lmasa, shuni yoqing:
     # fields = ("branch", "name", "is_active", "balance_cache")
@@ -86,9 +88,13 @@ class MoneyAccountAdmin(admin.ModelAdmin):
         if _is_owner(request.user):
             return super().get_fields(request, obj)
         # Staff uchun branchni edit qilmasin (avto staff branch).
-        base = ["name", "kind", "is_active", "balance_cache"]
+        base = ["name", "kind", "is_active", "balance_cache", "balance_display"]
         return base
 
+    @admin.display(description="Balans")
+    def balance_display(self, obj):
+        return obj.balance
+
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
         if _is_owner(request.user):
@@ -111,7 +117,8 @@ class MoneyAccountAdmin(admin.ModelAdmin):
         if not _is_owner(request.user):
             messages.info(request, _("Kassa sizning filialingizga avtomatik biriktirildi."))
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        # balance_display uchun stripe yig'indisi — har bir qatorga alohida aggregate bo'lmasin
+        qs = super().get_queryset(request).annotate(stripe_total=Coalesce(Sum("stripes__balance"), 0))
         if _is_owner(request.user):
             return qs
         bid = _staff_branch_id(request.user)
@@ -137,6 +144,8 @@ class CashTransactionAdmin(admin.ModelAdmin):
     search_fields = ("note", "ref_type", "ref_id", "account__name", "branch__name")
     date_hierarchy = "occurred_at"
     ordering = ("-occurred_at",)
+    # butun jadval bo'yicha COUNT(*) qilinmasin (ko'chirma: finance:account_statement)
+    show_full_result_count = False
 
     autocomplete_fields = ("account", "branch")
     list_select_related = ("branch", "account")
@@ -158,3 +167,65 @@ class CashTransactionAdmin(admin.ModelAdmin):
         if not bid:
             return qs.none()
         return qs.filter(branch_id=bid)
+
+
+@admin.register(AccountBalanceCheckpoint)
+class AccountBalanceCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("day", "account", "balance", "as_of")
+    list_filter = ("account__branch", "account")
+    date_hierarchy = "day"
+    ordering = ("-day",)
+    list_select_related = ("account", "account__branch")
+    readonly_fields = ("account", "day", "as_of", "balance", "created_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if _is_owner(request.user):
+            return qs
+        bid = _staff_branch_id(request.user)
+        if not bid:
+            return qs.none()
+        return qs.filter(account__branch_id=bid)
+
+
+@admin.register(DailyAccountClose)
+class DailyAccountCloseAdmin(admin.ModelAdmin):
+    list_display = (
+        "day",
+        "branch",
+        "account",
+        "opening_balance",
+        "in_total",
+        "out_total",
+        "closing_balance",
+    )
+    list_filter = ("branch", "account")
+    date_hierarchy = "day"
+    ordering = ("-day", "account__name")
+    list_select_related = ("branch", "account")
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if _is_owner(request.user):
+            return qs
+        bid = _staff_branch_id(request.user)
+        if not bid:
+            return qs.none()
+        return qs.filter(branch_id=bid)
+
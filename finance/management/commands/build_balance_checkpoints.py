@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import MoneyAccount
+from finance.services import build_balance_checkpoints
+
+
+class Command(BaseCommand):
+    help = "Har bir kassa uchun kunlik balans checkpointlarini (kechagacha) yozadi. Kunda 1 marta ishga tushiring."
+
+    def handle(self, *args, **options):
+        created = 0
+        for acc in MoneyAccount.objects.all():
+            created += build_balance_checkpoints(acc)
+        self.stdout.write(self.style.SUCCESS(f"{created} ta checkpoint yozildi."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import MoneyAccount
+from finance.services import close_business_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Tugagan biznes kunlarni yopadi: oxirgi saqlangan Z-report'dan kechagacha "
+        "DailyAccountClose qatorlarini ledger'dan yozadi. Har kecha (cutoff'dan keyin) ishga tushiring."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", help="Faqat shu MoneyAccount id")
+
+    def handle(self, *args, **options):
+        qs = MoneyAccount.objects.order_by("branch__name", "name")
+        if options["account"]:
+            qs = qs.filter(pk=options["account"])
+
+        written = 0
+        for acc in qs:
+            written += close_business_days(acc)
+        self.stdout.write(self.style.SUCCESS(f"{written} ta kunlik yopilish yozildi."))
@@ -0,0 +1,62 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Branch
+from finance.services import CashImportError, import_cash_txns
+
+
+def _json_rows(fh):
+    """JSON Lines (qatorma-qator, oqim) yoki oddiy JSON massiv."""
+    first = fh.read(1)
+    while first and first.isspace():
+        first = fh.read(1)
+    if first == "[":
+        yield from json.loads(first + fh.read())
+        return
+    buf = first + fh.readline()
+    while buf:
+        if buf.strip():
+            yield json.loads(buf)
+        buf = fh.readline()
+
+
+class Command(BaseCommand):
+    help = (
+        "Xarajat/tuzatish tranzaksiyalarini CSV yoki JSON(L) fayldan ommaviy import qiladi. "
+        "Ustunlar: account, amount, txn_type, direction, occurred_at, note."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV / JSON / JSONL fayl")
+        parser.add_argument("--branch", required=True, help="Branch id")
+        parser.add_argument("--format", choices=("csv", "json"), help="Default: fayl kengaytmasidan")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Faqat tekshiradi, yozmaydi")
+
+    def handle(self, *args, **options):
+        branch = Branch.objects.filter(pk=options["branch"]).first()
+        if branch is None:
+            raise CommandError("Branch topilmadi")
+
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.lower().endswith(".csv") else "json")
+
+        with open(path, encoding="utf-8-sig", newline="") as fh:
+            rows = csv.DictReader(fh) if fmt == "csv" else _json_rows(fh)
+            try:
+                result = import_cash_txns(
+                    rows, branch=branch, chunk_size=options["chunk_size"], dry_run=options["dry_run"]
+                )
+            except CashImportError as e:
+                for lineno, msg in e.errors:
+                    self.stderr.write(f"#{lineno}: {msg}")
+                raise CommandError(str(e))
+            except (json.JSONDecodeError, csv.Error) as e:
+                raise CommandError(f"Fayl o'qilmadi: {e}")
+
+        verb = "tekshirildi" if options["dry_run"] else "yozildi"
+        self.stdout.write(self.style.SUCCESS(f"{result['created']} ta tranzaksiya {verb} (batch {result['batch_id']})."))
+        for account_id, delta in result["accounts"].items():
+            self.stdout.write(f"  {account_id}: {delta:+}")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from finance.models import MoneyAccount
+from finance.services import rebuild_daily_closes
+
+
+class Command(BaseCommand):
+    help = "Kunlik yopilish (Z-report) qatorlarini ledger bo'yicha qayta quradi."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", help="Faqat shu MoneyAccount id")
+        parser.add_argument("--since", help="Shu biznes kundan boshlab (YYYY-MM-DD). Default: butun tarix")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_date(options["since"])
+            if since is None:
+                raise CommandError("--since noto'g'ri (YYYY-MM-DD)")
+
+        qs = MoneyAccount.objects.order_by("branch__name", "name")
+        if options["account"]:
+            qs = qs.filter(pk=options["account"])
+
+        written = 0
+        for acc in qs:
+            written += rebuild_daily_closes(acc, since_day=since)
+        self.stdout.write(self.style.SUCCESS(f"{written} ta kunlik yopilish yozildi."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import MoneyAccount
+from finance.services import reconcile_account_balance
+
+
+class Command(BaseCommand):
+    help = "balance_cache ni butun ledger bo'yicha qayta hisoblaydi (to'liq SUM) va farqlarni ko'rsatadi."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", help="Faqat shu MoneyAccount id")
+        parser.add_argument("--rebuild-checkpoints", action="store_true", help="Checkpointlarni ham qayta quradi")
+
+    def handle(self, *args, **options):
+        qs = MoneyAccount.objects.select_related("branch").order_by("branch__name", "name")
+        if options["account"]:
+            qs = qs.filter(pk=options["account"])
+
+        fixed = 0
+        for acc in qs:
+            old, new = reconcile_account_balance(acc, rebuild_checkpoints=options["rebuild_checkpoints"])
+            if old != new:
+                fixed += 1
+                self.stdout.write(self.style.WARNING(f"{acc}: {old} -> {new}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Tayyor. Tuzatilgan kassalar: {fixed}"))
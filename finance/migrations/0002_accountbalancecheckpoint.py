@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-17 21:46
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('as_of', models.DateTimeField()),
+                ('balance', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='finance.moneyaccount')),
+            ],
+            options={
+                'verbose_name': 'Balans checkpoint',
+                'verbose_name_plural': 'Balans checkpointlar',
+                'ordering': ('-day',),
+                'indexes': [models.Index(fields=['account', 'as_of'], name='finance_acc_account_71640d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'day'), name='uniq_account_checkpoint_day')],
+            },
+        ),
+    ]
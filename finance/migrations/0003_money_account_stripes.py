@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-17 21:47
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_accountbalancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moneyaccount',
+            name='balance_stripes',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='MoneyAccountStripe',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('balance', models.BigIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stripes', to='finance.moneyaccount')),
+            ],
+            options={
+                'verbose_name': 'Kassa stripe',
+                'verbose_name_plural': "Kassa stripe'lari",
+                'constraints': [models.UniqueConstraint(fields=('account', 'slot'), name='uniq_account_stripe_slot')],
+            },
+        ),
+    ]
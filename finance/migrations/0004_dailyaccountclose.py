@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-17 21:51
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('finance', '0003_money_account_stripes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAccountClose',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('opening_balance', models.BigIntegerField(default=0)),
+                ('closing_balance', models.BigIntegerField(default=0)),
+                ('in_total', models.BigIntegerField(default=0)),
+                ('out_total', models.BigIntegerField(default=0)),
+                ('sale_in', models.BigIntegerField(default=0)),
+                ('sale_out', models.BigIntegerField(default=0)),
+                ('import_in', models.BigIntegerField(default=0)),
+                ('import_out', models.BigIntegerField(default=0)),
+                ('expense_in', models.BigIntegerField(default=0)),
+                ('expense_out', models.BigIntegerField(default=0)),
+                ('transfer_in', models.BigIntegerField(default=0)),
+                ('transfer_out', models.BigIntegerField(default=0)),
+                ('adjust_in', models.BigIntegerField(default=0)),
+                ('adjust_out', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_closes', to='finance.moneyaccount')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_closes', to='core.branch')),
+            ],
+            options={
+                'verbose_name': 'Kunlik yopilish (Z-report)',
+                'verbose_name_plural': 'Kunlik yopilishlar (Z-report)',
+                'ordering': ('-day',),
+                'indexes': [models.Index(fields=['branch', 'day'], name='finance_dai_branch__2b6cbc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'day'), name='uniq_account_daily_close')],
+            },
+        ),
+    ]
@@ -1,7 +1,12 @@
+import random
 import uuid
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models, transaction
-from django.db.models import Sum, Case, When, IntegerField, F, Value
+from django.db.models import F
+from django.utils import timezone
 
 from core.models import Branch
 
@@ -51,6 +56,12 @@ class MoneyAccount(models.Model):
     # Cache (asosiy haqiqat — CashTransaction lar)
     balance_cache = models.BigIntegerField(default=0)  # so'm
 
+    # Striped rejim (ixtiyoriy): >0 bo'lsa tushumlar N ta MoneyAccountStripe qatoriga
+    # tasodifiy taqsimlanadi — "Kassa" qatori har bir sotuvda lock bo'lmaydi.
+    # Balans = balance_cache + stripe'lar yig'indisi. Qiymat o'zgarsa (save) eski stripe'lar
+    # lock ostida balance_cache ga yig'ilib o'chiriladi — pul yo'qolmaydi.
+    balance_stripes = models.PositiveSmallIntegerField(default=0)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -64,6 +75,57 @@ class MoneyAccount(models.Model):
     def __str__(self):
         return f"{self.branch.name} | {self.name}"
 
+    def save(self, *args, **kwargs):
+        # balance_cache faqat F() delta va reconcile (update_fields=["balance_cache"]) orqali yoziladi.
+        # Oddiy save (admin formasi, list_editable) yuklangan eski qiymatni qayta yozib,
+        # parallel deltalarni yo'qotmasin.
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                f.attname for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname != "balance_cache"
+            ]
+        if self._state.adding or "balance_stripes" not in (kwargs.get("update_fields") or ()):
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            old = (
+                MoneyAccount.objects.select_for_update()
+                .filter(pk=self.pk).values_list("balance_stripes", flat=True).first()
+            )
+            if old is not None and old != self.balance_stripes:
+                self.balance_cache = int(self.balance_cache) + fold_account_stripes(self.pk)
+            super().save(*args, **kwargs)
+
+    @property
+    def balance(self) -> int:
+        """
+        Joriy balans = balance_cache + mavjud stripe'lar (balance_stripes qiymatidan qat'i nazar).
+        Ro'yxatlarda `stripe_total` annotatsiyasi bo'lsa — qo'shimcha query yo'q.
+        """
+        extra = getattr(self, "stripe_total", None)
+        if extra is None:
+            extra = self.stripes.aggregate(s=models.Sum("balance"))["s"] or 0
+        return int(self.balance_cache) + int(extra)
+
+
+class MoneyAccountStripe(models.Model):
+    """Striped balans sub-hisoblagichi (MoneyAccount.balance_stripes > 0 bo'lganda)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    account = models.ForeignKey(MoneyAccount, on_delete=models.CASCADE, related_name="stripes")
+    slot = models.PositiveSmallIntegerField()
+    balance = models.BigIntegerField(default=0)  # so'm (balance_cache ga nisbatan delta)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "slot"], name="uniq_account_stripe_slot"),
+        ]
+        verbose_name = "Kassa stripe"
+        verbose_name_plural = "Kassa stripe'lari"
+
+    def __str__(self):
+        return f"{self.account_id} #{self.slot}: {self.balance}"
+
 
 # =====================
 # CASH TRANSACTION
@@ -116,33 +178,234 @@ class CashTransaction(models.Model):
         sign = "+" if self.direction == Direction.IN_ else "-"
         return f"{self.account} {sign}{self.amount}"
 
+    @property
+    def signed_amount(self) -> int:
+        return int(self.amount) if self.direction == Direction.IN_ else -int(self.amount)
+
+    def _cached_account(self) -> dict:
+        if CashTransaction.account.is_cached(self):
+            return {self.account_id: self.account}
+        return {}
+
     # =====================
-    # BALANCE RECALC
+    # BALANCE (delta)
     # =====================
-    def _recalc_balance(self):
-        agg = CashTransaction.objects.filter(
-            account_id=self.account_id
-        ).aggregate(
-            bal=Sum(
-                Case(
-                    When(
-                        direction=Direction.IN_,
-                        then=F("amount"),
-                    ),
-                    When(
-                        direction=Direction.OUT,
-                        then=Value(0) - F("amount"),
-                    ),
-                    default=Value(0),
-                    output_field=IntegerField(),
+    # balance_cache butun tarixni qayta SUM qilmasdan, faqat shu yozuv farqi bilan
+    # yangilanadi. To'liq qayta hisoblash — faqat `reconcile_balances` buyrug'ida.
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = None
+            if not self._state.adding:
+                old = (
+                    CashTransaction.objects.filter(pk=self.pk)
+                    .values("account_id", "direction", "txn_type", "amount", "occurred_at")
+                    .first()
                 )
-            )
-        )
+            super().save(*args, **kwargs)
 
-        self.account.balance_cache = agg["bal"] or 0
-        self.account.save(update_fields=["balance_cache"])
+            deltas = {self.account_id: self.signed_amount}
+            if old is not None:
+                old_signed = int(old["amount"]) if old["direction"] == Direction.IN_ else -int(old["amount"])
+                deltas[old["account_id"]] = deltas.get(old["account_id"], 0) - old_signed
+                invalidate_balance_checkpoints(old["account_id"], old["occurred_at"])
+            apply_balance_deltas(deltas, accounts=self._cached_account())
+            invalidate_balance_checkpoints(self.account_id, self.occurred_at)
 
-    def save(self, *args, **kwargs):
+            # Z-report: yopilgan (o'tgan) kun o'zgarsa — o'sha kundan keyingi yopilishlar qayta quriladi
+            if old is not None:
+                invalidate_daily_closes(old["account_id"], old["occurred_at"])
+            invalidate_daily_closes(self.account_id, self.occurred_at)
+
+    def delete(self, *args, **kwargs):
         with transaction.atomic():
-            super().save(*args, **kwargs)
-            transaction.on_commit(self._recalc_balance)
+            result = super().delete(*args, **kwargs)
+            apply_balance_deltas({self.account_id: -self.signed_amount}, accounts=self._cached_account())
+            invalidate_balance_checkpoints(self.account_id, self.occurred_at)
+            invalidate_daily_closes(self.account_id, self.occurred_at)
+        return result
+
+
+# =====================
+# BALANCE CHECKPOINT
+# =====================
+class AccountBalanceCheckpoint(models.Model):
+    """
+    Kun oxiridagi balans: `as_of` dan oldingi barcha tranzaksiyalar yig'indisi.
+    Haqiqiy balans = oxirgi checkpoint + undan keyingi tranzaksiyalar.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    account = models.ForeignKey(MoneyAccount, on_delete=models.CASCADE, related_name="balance_checkpoints")
+    day = models.DateField()
+    as_of = models.DateTimeField()  # day dan keyingi kun boshi (exclusive)
+    balance = models.BigIntegerField()  # so'm
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "day"], name="uniq_account_checkpoint_day"),
+        ]
+        indexes = [
+            models.Index(fields=["account", "as_of"]),
+        ]
+        ordering = ("-day",)
+        verbose_name = "Balans checkpoint"
+        verbose_name_plural = "Balans checkpointlar"
+
+    def __str__(self):
+        return f"{self.account} | {self.day} | {self.balance}"
+
+
+# =====================
+# DAILY CLOSE (Z-REPORT)
+# =====================
+class DailyAccountClose(models.Model):
+    """
+    Kassaning biznes kun yakuni (Z-report): ochilish balansi, TxnType bo'yicha
+    IN/OUT va yopilish balansi. Biznes kun — Asia/Tashkent, BUSINESS_DAY_CUTOFF
+    (masalan 04:00) dan keyingi kun shu vaqtgacha.
+
+    Faqat yopilgan (o'tgan) kunlar saqlanadi: `close_business_days` buyrug'i (har kecha)
+    ledger'dan aggregate bilan yozadi — sotuv yo'lida bu jadvalga yozuv yo'q.
+    Joriy kun (yoki hali yopilmagan kun) hisoboti so'rov paytida ledger'dan hisoblanadi.
+    O'tgan kunga tranzaksiya yozilsa o'sha kundan keyingi qatorlar o'chiriladi
+    (invalidate_daily_closes) va keyingi yopilishda qayta quriladi.
+    To'liq qayta qurish — `rebuild_daily_closes` buyrug'i.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="daily_closes")
+    account = models.ForeignKey(MoneyAccount, on_delete=models.CASCADE, related_name="daily_closes")
+    day = models.DateField()
+
+    opening_balance = models.BigIntegerField(default=0)  # so'm
+    closing_balance = models.BigIntegerField(default=0)  # so'm
+    in_total = models.BigIntegerField(default=0)
+    out_total = models.BigIntegerField(default=0)
+
+    # TxnType bo'yicha: "<txn_type>_<direction>"
+    sale_in = models.BigIntegerField(default=0)
+    sale_out = models.BigIntegerField(default=0)
+    import_in = models.BigIntegerField(default=0)
+    import_out = models.BigIntegerField(default=0)
+    expense_in = models.BigIntegerField(default=0)
+    expense_out = models.BigIntegerField(default=0)
+    transfer_in = models.BigIntegerField(default=0)
+    transfer_out = models.BigIntegerField(default=0)
+    adjust_in = models.BigIntegerField(default=0)
+    adjust_out = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "day"], name="uniq_account_daily_close"),
+        ]
+        indexes = [
+            models.Index(fields=["branch", "day"]),
+        ]
+        ordering = ("-day",)
+        verbose_name = "Kunlik yopilish (Z-report)"
+        verbose_name_plural = "Kunlik yopilishlar (Z-report)"
+
+    def __str__(self):
+        return f"{self.account} | {self.day} | {self.closing_balance}"
+
+    @staticmethod
+    def column(txn_type: str, direction: str) -> str:
+        return f"{txn_type}_{direction}"
+
+
+def business_day_cutoff() -> timedelta:
+    raw = str(getattr(settings, "BUSINESS_DAY_CUTOFF", "") or "00:00")
+    hh, _, mm = raw.partition(":")
+    return timedelta(hours=int(hh), minutes=int(mm or 0))
+
+
+def business_day(dt):
+    """Tranzaksiya vaqti -> biznes kun (mahalliy vaqt, cutoff hisobga olinadi)."""
+    return (timezone.localtime(dt) - business_day_cutoff()).date()
+
+
+def business_day_start(day):
+    """Biznes kun boshlanishi (aware datetime)."""
+    return timezone.make_aware(datetime.combine(day, time.min)) + business_day_cutoff()
+
+
+def current_business_day():
+    return business_day(timezone.now())
+
+
+def invalidate_daily_closes(account_id, occurred_at) -> None:
+    """
+    O'tgan biznes kunga yozilgan/o'zgargan tranzaksiya o'sha kundan boshlab saqlangan
+    Z-report qatorlarini eskirtiradi — o'chiramiz. Joriy kun uchun query yo'q (u saqlanmaydi).
+    """
+    if occurred_at is None:
+        return
+    day = business_day(occurred_at)
+    if day >= current_business_day():
+        return
+    DailyAccountClose.objects.filter(account_id=account_id, day__gte=day).delete()
+
+
+def fold_account_stripes(account_id) -> int:
+    """
+    Kassaning barcha stripe qatorlarini balance_cache ga yig'ib o'chiradi (kassa qatori
+    chaqiruvchi tomonidan lock qilingan bo'lishi kerak). Yig'ilgan summani qaytaradi.
+    """
+    total = sum(
+        int(b) for b in MoneyAccountStripe.objects.select_for_update()
+        .filter(account_id=account_id).order_by("slot").values_list("balance", flat=True)
+    )
+    MoneyAccountStripe.objects.filter(account_id=account_id).delete()
+    if total:
+        MoneyAccount.objects.filter(pk=account_id).update(balance_cache=F("balance_cache") + total)
+    return total
+
+
+def apply_balance_deltas(deltas: dict, *, accounts: dict | None = None) -> None:
+    """
+    {account_id: +/-so'm} — balansga F() bilan qo'shadi (SUM'siz).
+
+    Oddiy kassa: MoneyAccount.balance_cache. Striped kassa: tasodifiy bitta stripe qatori.
+    accounts: {account_id: MoneyAccount} — balance_stripes ni qayta o'qimaslik uchun.
+    """
+    deltas = {aid: int(d) for aid, d in deltas.items() if d}
+    if not deltas:
+        return
+
+    stripes = {aid: acc.balance_stripes for aid, acc in (accounts or {}).items() if aid in deltas}
+    missing = [aid for aid in deltas if aid not in stripes]
+    if missing:
+        stripes.update(MoneyAccount.objects.filter(pk__in=missing).values_list("pk", "balance_stripes"))
+
+    for account_id, delta in deltas.items():
+        n = stripes.get(account_id) or 0
+        if not n:
+            MoneyAccount.objects.filter(pk=account_id).update(balance_cache=F("balance_cache") + delta)
+            continue
+
+        slot = random.randrange(n)
+        updated = MoneyAccountStripe.objects.filter(account_id=account_id, slot=slot).update(
+            balance=F("balance") + delta
+        )
+        if not updated:
+            MoneyAccountStripe.objects.bulk_create(
+                [MoneyAccountStripe(account_id=account_id, slot=i) for i in range(n)],
+                ignore_conflicts=True,
+            )
+            MoneyAccountStripe.objects.filter(account_id=account_id, slot=slot).update(balance=F("balance") + delta)
+
+
+def invalidate_balance_checkpoints(account_id, occurred_at) -> None:
+    """
+    Orqa sana bilan yozilgan tranzaksiya eski checkpointlarni buzadi — ularni o'chiramiz
+    (keyingi `build_balance_checkpoints` qayta quradi). Bugungi yozuvlar uchun query yo'q:
+    checkpoint faqat tugagan kunlar uchun bo'ladi.
+    """
+    if occurred_at is None:
+        return
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    if occurred_at >= today_start:
+        return
+    AccountBalanceCheckpoint.objects.filter(account_id=account_id, as_of__gt=occurred_at).delete()
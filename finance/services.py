@@ -1,7 +1,51 @@
 # finance/services.py
+import uuid
+from datetime import datetime, time, timedelta
+
 from django.db import transaction
+from django.db.models import Case, DateTimeField, ExpressionWrapper, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
 from django.utils import timezone
-from .models import CashTransaction, MoneyAccount
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core.pagination import keyset_page
+
+from .models import (
+    AccountBalanceCheckpoint,
+    CashTransaction,
+    DailyAccountClose,
+    Direction,
+    MoneyAccount,
+    MoneyAccountStripe,
+    TxnType,
+    apply_balance_deltas,
+    business_day,
+    business_day_cutoff,
+    business_day_start,
+    current_business_day,
+    invalidate_balance_checkpoints,
+    invalidate_daily_closes,
+)
+
+SIGNED_AMOUNT = Case(
+    When(direction=Direction.IN_, then=F("amount")),
+    When(direction=Direction.OUT, then=Value(0) - F("amount")),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+
+@transaction.atomic
+def lock_account_balance(account: MoneyAccount) -> tuple[MoneyAccount, int]:
+    """
+    Kassani va mavjud stripe'larini (slot tartibida) lock qiladi va aniq balansni qaytaradi.
+    Stripe'lar balance_stripes qiymatidan qat'i nazar qo'shiladi (o'chirilgan rejimdan qolganlari ham).
+    Faqat kam uchraydigan OUT yo'li uchun (overdraft tekshiruvi).
+    """
+    acc = MoneyAccount.objects.select_for_update().get(pk=account.pk)
+    stripes = list(acc.stripes.select_for_update().order_by("slot").values_list("balance", flat=True))
+    return acc, int(acc.balance_cache) + sum(int(b) for b in stripes)
+
 
 @transaction.atomic
 def record_cash_txn(*, account: MoneyAccount, direction: str, txn_type: str, amount: int,
@@ -9,10 +53,17 @@ def record_cash_txn(*, account: MoneyAccount, direction: str, txn_type: str, amo
     if occurred_at is None:
         occurred_at = timezone.now()
 
-    acc = MoneyAccount.objects.select_for_update().get(pk=account.pk)
+    if account.balance_stripes and direction == Direction.IN_:
+        # striped IN: kassa qatori lock qilinmaydi, delta tasodifiy stripe'ga tushadi
+        acc = account
+    elif account.balance_stripes:
+        acc, _ = lock_account_balance(account)
+    else:
+        acc = MoneyAccount.objects.select_for_update().get(pk=account.pk)
 
+    # CashTransaction.save() balansni va kunlik yopilishni delta bilan yangilaydi
     tx = CashTransaction.objects.create(
-        branch=acc.branch,
+        branch_id=acc.branch_id,
         account=acc,
         direction=direction,      # "in" / "out"
         txn_type=txn_type,        # "sale" / "import" / ...
@@ -22,12 +73,511 @@ def record_cash_txn(*, account: MoneyAccount, direction: str, txn_type: str, amo
         ref_type=ref_type,
         ref_id=ref_id,
     )
+    if not acc.balance_stripes:
+        acc.balance_cache += tx.signed_amount
+
+    return tx
+
+
+@transaction.atomic
+def transfer(from_acc: MoneyAccount, to_acc: MoneyAccount, amount: int, *,
+             note: str | None = None, occurred_at=None) -> tuple[CashTransaction, CashTransaction]:
+    """
+    Kassadan kassaga o'tkazma: OUT + IN juftligi (umumiy ref_id bilan).
+
+    Ikkala kassa (va stripe'lari) pk tartibida lock qilinadi — qarama-qarshi o'tkazmalar
+    deadlock bermaydi. Ikkala qator bitta bulk_create, ikkala balans bitta UPDATE bilan.
+    Lock ostida bo'lgani uchun striped kassa deltasi ham balance_cache ga yoziladi.
+    """
+    amount = int(amount)
+    if amount < 1:
+        raise ValueError("Summa 0 dan katta bo'lishi kerak")
+    if from_acc.pk == to_acc.pk:
+        raise ValueError("Bir kassaning o'ziga o'tkazib bo'lmaydi")
+    if occurred_at is None:
+        occurred_at = timezone.now()
+
+    locked = {
+        acc.pk: acc
+        for acc in MoneyAccount.objects.select_for_update().filter(pk__in=[from_acc.pk, to_acc.pk]).order_by("pk")
+    }
+    if len(locked) != 2:
+        raise ValueError("Kassa topilmadi")
+    src, dst = locked[from_acc.pk], locked[to_acc.pk]
+    if not src.is_active or not dst.is_active:
+        raise ValueError("Kassa aktiv emas")
+
+    stripe_sums: dict = {}
+    for account_id, bal in (
+        MoneyAccountStripe.objects.select_for_update()
+        .filter(account_id__in=list(locked))
+        .order_by("account_id", "slot")
+        .values_list("account_id", "balance")
+    ):
+        stripe_sums[account_id] = stripe_sums.get(account_id, 0) + int(bal)
+
+    available = int(src.balance_cache) + stripe_sums.get(src.pk, 0)
+    if available < amount:
+        raise ValueError(f"Kassada pul yetarli emas. Balance={available}, kerak={amount}")
+
+    ref_id = uuid.uuid4()
+    common = dict(txn_type=TxnType.TRANSFER, amount=amount, occurred_at=occurred_at, note=note,
+                  ref_type="transfer", ref_id=ref_id)
+    out_tx, in_tx = CashTransaction.objects.bulk_create([
+        CashTransaction(branch_id=src.branch_id, account=src, direction=Direction.OUT, **common),
+        CashTransaction(branch_id=dst.branch_id, account=dst, direction=Direction.IN_, **common),
+    ])
+
+    MoneyAccount.objects.filter(pk__in=[src.pk, dst.pk]).update(
+        balance_cache=F("balance_cache") + Case(
+            When(pk=src.pk, then=Value(-amount)),
+            When(pk=dst.pk, then=Value(amount)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+    for acc, fresh, delta in ((from_acc, src, -amount), (to_acc, dst, amount)):
+        acc.balance_cache = fresh.balance_cache + delta
+
+    for account_id in (src.pk, dst.pk):
+        invalidate_balance_checkpoints(account_id, occurred_at)
+        invalidate_daily_closes(account_id, occurred_at)
+    return out_tx, in_tx
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def ledger_sum(account_id, *, start=None, end=None) -> int:
+    """[start, end) oralig'idagi tranzaksiyalar yig'indisi (IN +, OUT -)."""
+    qs = CashTransaction.objects.filter(account_id=account_id)
+    if start is not None:
+        qs = qs.filter(occurred_at__gte=start)
+    if end is not None:
+        qs = qs.filter(occurred_at__lt=end)
+    return int(qs.aggregate(bal=Sum(SIGNED_AMOUNT))["bal"] or 0)
+
+
+def nearest_checkpoint(account_id, at=None):
+    qs = AccountBalanceCheckpoint.objects.filter(account_id=account_id)
+    if at is not None:
+        qs = qs.filter(as_of__lte=at)
+    return qs.order_by("-as_of").first()
+
+
+def account_balance(account, *, at=None) -> int:
+    """
+    Ledger bo'yicha balans: eng yaqin checkpoint + undan keyingi tranzaksiyalar.
+    at=None — hozirgi (barcha) balans; at berilsa — o'sha paytdagi balans.
+    """
+    cp = nearest_checkpoint(account.pk, at)
+    base = cp.balance if cp else 0
+    return base + ledger_sum(account.pk, start=cp.as_of if cp else None, end=at)
+
+
+def balance_before(account_id, occurred_at, txn_id=None) -> int:
+    """
+    (occurred_at, id) kalitidan oldingi balans: eng yaqin checkpoint + oyna yig'indisi.
+    txn_id berilsa — shu kalitdagi tranzaksiya ham (id < txn_id lar) hisobga olinadi.
+    """
+    cp = nearest_checkpoint(account_id, occurred_at)
+    qs = CashTransaction.objects.filter(account_id=account_id)
+    if cp is not None:
+        qs = qs.filter(occurred_at__gte=cp.as_of)
+    cond = Q(occurred_at__lt=occurred_at)
+    if txn_id is not None:
+        cond |= Q(occurred_at=occurred_at, id__lt=txn_id)
+    window = qs.filter(cond).aggregate(bal=Sum(SIGNED_AMOUNT))["bal"] or 0
+    return (cp.balance if cp else 0) + int(window)
+
+
+STATEMENT_FIELDS = ("id", "occurred_at", "direction", "txn_type", "amount", "note", "ref_type", "ref_id")
+
+
+def _statement_qs(account_id, *, start=None, end=None):
+    qs = CashTransaction.objects.filter(account_id=account_id)
+    if start is not None:
+        qs = qs.filter(occurred_at__gte=start)
+    if end is not None:
+        qs = qs.filter(occurred_at__lt=end)
+    return qs.values(*STATEMENT_FIELDS)
+
+
+def _signed(row) -> int:
+    return int(row["amount"]) if row["direction"] == Direction.IN_ else -int(row["amount"])
+
+
+def account_statement_page(account, *, cursor=None, limit=50, start=None, end=None):
+    """
+    Kassa ko'chirmasi (eskidan yangiga), (occurred_at, id) bo'yicha keyset sahifa.
+    Har bir qatorda `balance` — shu tranzaksiyadan keyingi balans.
+    (rows, next_cursor) qaytaradi. Noto'g'ri cursor — ValueError.
+    """
+    rows, next_cursor = keyset_page(
+        _statement_qs(account.pk, start=start, end=end),
+        cursor=cursor, limit=limit, keys=("occurred_at", "id"), desc=False,
+    )
+    if rows:
+        balance = balance_before(account.pk, rows[0]["occurred_at"], rows[0]["id"])
+        for row in rows:
+            balance += _signed(row)
+            row["balance"] = balance
+    return rows, next_cursor
+
+
+def iter_account_statement(account, *, start=None, end=None, chunk_size=2000):
+    """
+    Butun ko'chirma generator sifatida (CSV eksport uchun): server-side cursor
+    bilan o'qiladi, xotira hajmi tranzaksiyalar soniga bog'liq emas.
+    """
+    balance = balance_before(account.pk, start) if start is not None else 0
+    qs = _statement_qs(account.pk, start=start, end=end).order_by("occurred_at", "id")
+    for row in qs.iterator(chunk_size=chunk_size):
+        balance += _signed(row)
+        row["balance"] = balance
+        yield row
+
 
-    # cache update
-    if direction == "in":
-        acc.balance_cache += amount
+def build_balance_checkpoints(account, *, until_day=None) -> int:
+    """
+    Oxirgi checkpointdan `until_day` (default: kecha) gacha har kun uchun checkpoint yozadi.
+    Bitta guruhlangan aggregate + bitta bulk_create. Yaratilganlar sonini qaytaradi.
+    """
+    if until_day is None:
+        until_day = timezone.localdate() - timedelta(days=1)
+
+    last = AccountBalanceCheckpoint.objects.filter(account=account).order_by("-day").first()
+    if last is not None:
+        if last.day >= until_day:
+            return 0
+        first_day = last.day + timedelta(days=1)
+        balance = last.balance
     else:
-        acc.balance_cache -= amount
-    acc.save(update_fields=["balance_cache"])
+        first_txn = CashTransaction.objects.filter(account=account).order_by("occurred_at").first()
+        if first_txn is None:
+            return 0
+        first_day = timezone.localtime(first_txn.occurred_at).date()
+        balance = 0
+        if first_day > until_day:
+            return 0
+
+    per_day = dict(
+        CashTransaction.objects.filter(
+            account=account,
+            occurred_at__gte=_day_start(first_day),
+            occurred_at__lt=_day_start(until_day + timedelta(days=1)),
+        )
+        .annotate(d=TruncDate("occurred_at"))
+        .values("d")
+        .annotate(s=Sum(SIGNED_AMOUNT))
+        .values_list("d", "s")
+    )
+
+    rows = []
+    day = first_day
+    while day <= until_day:
+        balance += int(per_day.get(day) or 0)
+        rows.append(
+            AccountBalanceCheckpoint(
+                account=account,
+                day=day,
+                as_of=_day_start(day + timedelta(days=1)),
+                balance=balance,
+            )
+        )
+        day += timedelta(days=1)
+
+    AccountBalanceCheckpoint.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+@transaction.atomic
+def reconcile_account_balance(account, *, rebuild_checkpoints: bool = False) -> tuple[int, int]:
+    """
+    To'liq qayta hisoblash (faqat reconcile buyrug'i uchun): butun ledger SUM.
+    Striped kassada stripe'lar balance_cache ga yig'ilib, nolga tushiriladi.
+    (eski balans, yangi balans) qaytaradi.
+    """
+    acc, old = lock_account_balance(account)
+    new = ledger_sum(acc.pk)
+    if int(acc.balance_cache) != new:
+        acc.balance_cache = new
+        acc.save(update_fields=["balance_cache"])
+    acc.stripes.exclude(balance=0).update(balance=0)
+
+    if rebuild_checkpoints:
+        AccountBalanceCheckpoint.objects.filter(account=acc).delete()
+        build_balance_checkpoints(acc)
+    return old, new
+
+
+# =====================
+# DAILY CLOSE (Z-REPORT)
+# =====================
+def _business_day_expr():
+    cutoff = business_day_cutoff()
+    if not cutoff:
+        return TruncDate("occurred_at")
+    return TruncDate(ExpressionWrapper(F("occurred_at") - Value(cutoff), output_field=DateTimeField()))
+
+
+def _close_rows(account_id, first_day, last_day) -> list[DailyAccountClose]:
+    """
+    [first_day, last_day] biznes kunlari uchun ledger'dan DailyAccountClose qatorlari
+    (saqlanmagan). Bitta guruhlangan aggregate; tranzaksiyasiz kunlar uchun qator yo'q.
+    """
+    start = business_day_start(first_day)
+    grouped = (
+        CashTransaction.objects.filter(
+            account_id=account_id,
+            occurred_at__gte=start,
+            occurred_at__lt=business_day_start(last_day + timedelta(days=1)),
+        )
+        .annotate(d=_business_day_expr())
+        .values("d", "txn_type", "direction")
+        .annotate(s=Sum("amount"))
+        .values_list("d", "txn_type", "direction", "s")
+    )
+    per_day: dict = {}
+    for day, txn_type, direction, total in grouped:
+        per_day.setdefault(day, {})[DailyAccountClose.column(txn_type, direction)] = int(total or 0)
+    if not per_day:
+        return []
+
+    branch_id = MoneyAccount.objects.filter(pk=account_id).values_list("branch_id", flat=True).get()
+    balance = balance_before(account_id, start)
+    rows = []
+    for day in sorted(per_day):
+        cols = per_day[day]
+        in_total = sum(v for c, v in cols.items() if c.endswith("_" + Direction.IN_))
+        out_total = sum(v for c, v in cols.items() if c.endswith("_" + Direction.OUT))
+        row = DailyAccountClose(
+            branch_id=branch_id,
+            account_id=account_id,
+            day=day,
+            opening_balance=balance,
+            closing_balance=balance + in_total - out_total,
+            in_total=in_total,
+            out_total=out_total,
+            **cols,
+        )
+        balance = row.closing_balance
+        rows.append(row)
+    return rows
+
+
+@transaction.atomic
+def rebuild_daily_closes(account, *, since_day=None) -> int:
+    """
+    `since_day` (default: birinchi tranzaksiya kuni) dan kechagi biznes kungacha
+    Z-report qatorlarini qayta quradi. Joriy kun saqlanmaydi.
+    """
+    first = CashTransaction.objects.filter(account=account).order_by("occurred_at").first()
+    if since_day is None:
+        since_day = business_day(first.occurred_at) if first else None
+
+    qs = DailyAccountClose.objects.filter(account=account)
+    if since_day is not None:
+        qs = qs.filter(day__gte=since_day)
+    qs.delete()
+    if first is None or since_day is None:
+        return 0
+
+    last_day = current_business_day() - timedelta(days=1)
+    if since_day > last_day:
+        return 0
+    rows = _close_rows(account.pk, since_day, last_day)
+    DailyAccountClose.objects.bulk_create(rows)
+    return len(rows)
+
+
+@transaction.atomic
+def close_business_days(account) -> int:
+    """
+    Oxirgi saqlangan yopilishdan keyingi kundan kechagi biznes kungacha yopadi (har kecha).
+    Bitta guruhlangan aggregate; yozilgan qatorlar sonini qaytaradi.
+    """
+    last_closed = (
+        DailyAccountClose.objects.filter(account=account).order_by("-day").values_list("day", flat=True).first()
+    )
+    if last_closed is not None:
+        first_day = last_closed + timedelta(days=1)
+    else:
+        first = CashTransaction.objects.filter(account=account).order_by("occurred_at").values_list(
+            "occurred_at", flat=True
+        ).first()
+        if first is None:
+            return 0
+        first_day = business_day(first)
+
+    last_day = current_business_day() - timedelta(days=1)
+    if first_day > last_day:
+        return 0
+    rows = _close_rows(account.pk, first_day, last_day)
+    DailyAccountClose.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def daily_close_report(branch, day) -> list[DailyAccountClose]:
+    """
+    Filialning `day` biznes kuni uchun har bir aktiv kassa bo'yicha bitta qator.
+    O'sha kuni tranzaksiya bo'lmagan kassa uchun (saqlanmagan) bo'sh qator: opening=closing.
+    """
+    accounts = list(MoneyAccount.objects.filter(branch=branch, is_active=True).order_by("name"))
+    closes = {
+        c.account_id: c
+        for c in DailyAccountClose.objects.filter(branch=branch, day=day, account__in=accounts)
+    }
+    out = []
+    for acc in accounts:
+        row = closes.get(acc.pk)
+        if row is None:
+            # yopilmagan kun (joriy yoki hali yopilmagan): ledger'dan hisoblanadi, saqlanmaydi
+            built = _close_rows(acc.pk, day, day)
+            row = built[0] if built else None
+        if row is None:
+            balance = balance_before(acc.pk, business_day_start(day))
+            row = DailyAccountClose(
+                branch=branch, account=acc, day=day, opening_balance=balance, closing_balance=balance
+            )
+        row.account = acc
+        out.append(row)
+    return out
+
+
+# =====================
+# BULK IMPORT (xarajat / tuzatish)
+# =====================
+IMPORT_TXN_TYPES = (TxnType.EXPENSE, TxnType.ADJUST)
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ERRORS = 50
+
+
+class CashImportError(ValueError):
+    """Import qatorlarida xato: `errors` — [(qator raqami, xabar), ...]. Hech narsa yozilmaydi."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} ta qatorda xato")
+
+
+def _import_occurred_at(raw, default):
+    raw = (str(raw).strip() if raw is not None else "")
+    if not raw:
+        return default
+    dt = parse_datetime(raw)
+    if dt is None:
+        d = parse_date(raw)
+        if d is None:
+            raise ValueError("occurred_at noto'g'ri")
+        return business_day_start(d)
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+def _import_row(row: dict, accounts: dict, *, branch_id, batch_id, now) -> CashTransaction:
+    """Bitta qatorni tekshiradi va saqlanmagan CashTransaction qaytaradi (xato — ValueError)."""
+    key = str(row.get("account") or "").strip()
+    acc = accounts.get(key) or accounts.get(key.lower())
+    if acc is None:
+        raise ValueError(f"kassa topilmadi: {key!r}")
+
+    txn_type = str(row.get("txn_type") or TxnType.EXPENSE).strip().lower()
+    if txn_type not in IMPORT_TXN_TYPES:
+        raise ValueError(f"txn_type faqat {'/'.join(IMPORT_TXN_TYPES)} bo'lishi mumkin")
+
+    direction = str(row.get("direction") or Direction.OUT).strip().lower()
+    if direction not in Direction.values:
+        raise ValueError("direction in/out bo'lishi kerak")
+    if txn_type == TxnType.EXPENSE and direction != Direction.OUT:
+        raise ValueError("expense faqat out bo'ladi")
+
+    try:
+        amount = int(str(row.get("amount") or "").replace(" ", ""))
+    except ValueError:
+        raise ValueError("amount butun son bo'lishi kerak")
+    if amount < 1:
+        raise ValueError("amount > 0 bo'lishi kerak")
+
+    note = (str(row.get("note") or "").strip() or None)
+    if note and len(note) > 255:
+        raise ValueError("note 255 belgidan uzun")
+
+    return CashTransaction(
+        branch_id=branch_id,
+        account=acc,
+        direction=direction,
+        txn_type=txn_type,
+        amount=amount,
+        occurred_at=_import_occurred_at(row.get("occurred_at"), now),
+        note=note,
+        ref_type="cash_import",
+        ref_id=batch_id,
+    )
+
+
+def _flush_import_chunk(chunk: list[CashTransaction]) -> None:
+    """bulk_create + har bir kassa uchun bitta balans delta; eskirgan checkpoint/Z-report o'chiriladi."""
+    CashTransaction.objects.bulk_create(chunk)
+
+    deltas: dict = {}
+    earliest: dict = {}
+    for tx in chunk:
+        deltas[tx.account_id] = deltas.get(tx.account_id, 0) + tx.signed_amount
+        if tx.account_id not in earliest or tx.occurred_at < earliest[tx.account_id]:
+            earliest[tx.account_id] = tx.occurred_at
+    apply_balance_deltas(deltas, accounts={tx.account_id: tx.account for tx in chunk})
+    for account_id, occurred_at in earliest.items():
+        invalidate_balance_checkpoints(account_id, occurred_at)
+        invalidate_daily_closes(account_id, occurred_at)
+
+
+@transaction.atomic
+def import_cash_txns(rows, *, branch, chunk_size: int = IMPORT_CHUNK_SIZE, dry_run: bool = False) -> dict:
+    """
+    Xarajat/tuzatish tranzaksiyalarini ommaviy yozadi.
+
+    rows — dict'lar iteratori (CSV DictReader, JSON Lines ...): account (nomi yoki id),
+    amount, txn_type (expense/adjust), direction (default out), occurred_at, note.
+    Qatorlar oqim bo'yicha tekshiriladi va `chunk_size` lik bo'laklarda bulk_create qilinadi.
+    Bitta bo'lakda har bir kassa balansi bitta UPDATE bilan o'zgaradi.
+
+    Xato bo'lsa hammasi bekor qilinadi — CashImportError. dry_run=True — faqat tekshiradi.
+    {"batch_id", "created", "accounts": {account_id: net delta}} qaytaradi.
+    """
+    accounts: dict = {}
+    for acc in MoneyAccount.objects.filter(branch=branch, is_active=True):
+        accounts[str(acc.pk)] = acc
+        accounts[acc.name.strip().lower()] = acc
+
+    batch_id = uuid.uuid4()
+    now = timezone.now()
+    errors = []
+    chunk: list[CashTransaction] = []
+    created = 0
+    net: dict = {}
+
+    for lineno, row in enumerate(rows, start=1):
+        try:
+            tx = _import_row(row, accounts, branch_id=branch.pk, batch_id=batch_id, now=now)
+        except ValueError as e:
+            errors.append((lineno, str(e)))
+            if len(errors) >= IMPORT_MAX_ERRORS:
+                break
+            continue
+
+        created += 1
+        net[str(tx.account_id)] = net.get(str(tx.account_id), 0) + tx.signed_amount
+        if errors or dry_run:
+            continue  # faqat tekshirish davom etadi
+        chunk.append(tx)
+        if len(chunk) >= chunk_size:
+            _flush_import_chunk(chunk)
+            chunk = []
+
+    if errors:
+        raise CashImportError(errors)
+    if chunk and not dry_run:
+        _flush_import_chunk(chunk)
+    return {"batch_id": batch_id, "created": created, "accounts": net}
 
-    return tx
@@ -1,3 +1,11 @@
+from django.urls import path
+
+from . import views
+
+app_name = "finance"
 
 urlpatterns = [
+    path("accounts/<uuid:pk>/statement/", views.account_statement, name="account_statement"),
+    path("accounts/<uuid:pk>/statement.csv", views.account_statement_csv, name="account_statement_csv"),
+    path("daily-close/", views.daily_close, name="daily_close"),
 ]
@@ -1,3 +1,156 @@
-from django.shortcuts import render
+# finance/views.py
+from __future__ import annotations
+
+import csv
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+
+from core.middleware import get_active_branch
+from core.pagination import page_size
+
+from .models import DailyAccountClose, MoneyAccount, business_day
+from .services import account_statement_page, daily_close_report, iter_account_statement
+
+
+def _date_range(request):
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD (ikkalasi ham kiritiladi) -> (start, end) [start, end)."""
+    start = end = None
+    raw_from = (request.GET.get("from") or "").strip()
+    raw_to = (request.GET.get("to") or "").strip()
+    if raw_from:
+        d = parse_date(raw_from)
+        if d is None:
+            raise ValueError("from noto'g'ri (YYYY-MM-DD)")
+        start = timezone.make_aware(datetime.combine(d, time.min))
+    if raw_to:
+        d = parse_date(raw_to)
+        if d is None:
+            raise ValueError("to noto'g'ri (YYYY-MM-DD)")
+        end = timezone.make_aware(datetime.combine(d + timedelta(days=1), time.min))
+    return start, end
+
+
+def _branch_account(request, pk):
+    branch = get_active_branch(request)
+    if not branch:
+        return None
+    return get_object_or_404(MoneyAccount, pk=pk, branch=branch)
+
+
+def _row_json(row) -> dict:
+    return {
+        "id": str(row["id"]),
+        "occurred_at": row["occurred_at"].isoformat(),
+        "direction": row["direction"],
+        "txn_type": row["txn_type"],
+        "amount": int(row["amount"]),
+        "balance": row["balance"],
+        "note": row["note"] or "",
+        "ref_type": row["ref_type"] or "",
+        "ref_id": str(row["ref_id"]) if row["ref_id"] else "",
+    }
+
+
+@login_required
+@require_GET
+def account_statement(request, pk):
+    """Kassa ko'chirmasi: ?from=&to=&cursor=&limit= (eskidan yangiga, running balance bilan)."""
+    acc = _branch_account(request, pk)
+    if acc is None:
+        return JsonResponse({"error": "branch_not_selected"}, status=400)
+
+    try:
+        start, end = _date_range(request)
+        rows, next_cursor = account_statement_page(
+            acc,
+            cursor=request.GET.get("cursor") or None,
+            limit=page_size(request.GET.get("limit")),
+            start=start,
+            end=end,
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(
+        {
+            "account": {"id": str(acc.id), "name": acc.name},
+            "rows": [_row_json(r) for r in rows],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+class _Echo:
+    """csv.writer uchun: yozilgan qatorni qaytaradi (buferlamaydi)."""
+
+    def write(self, value):
+        return value
+
+
+CSV_HEADER = ["occurred_at", "direction", "txn_type", "amount", "balance", "note", "ref_type", "ref_id", "id"]
+
+
+def _csv_rows(acc, start, end):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in iter_account_statement(acc, start=start, end=end):
+        r = _row_json(row)
+        yield writer.writerow([r[k] for k in CSV_HEADER])
+
+
+@login_required
+@require_GET
+def account_statement_csv(request, pk):
+    """Ko'chirma CSV (streaming): butun oraliq xotiraga yig'ilmaydi."""
+    acc = _branch_account(request, pk)
+    if acc is None:
+        return JsonResponse({"error": "branch_not_selected"}, status=400)
+    try:
+        start, end = _date_range(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    resp = StreamingHttpResponse(_csv_rows(acc, start, end), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="statement-{acc.pk}.csv"'
+    return resp
+
+
+CLOSE_TYPE_COLUMNS = [f.name for f in DailyAccountClose._meta.fields if f.name.endswith(("_in", "_out"))]
+
+
+@login_required
+@require_GET
+def daily_close(request):
+    """Z-report: ?day=YYYY-MM-DD (default: joriy biznes kun) — har bir kassa uchun bitta qator."""
+    branch = get_active_branch(request)
+    if not branch:
+        return JsonResponse({"error": "branch_not_selected"}, status=400)
+
+    raw = (request.GET.get("day") or "").strip()
+    day = parse_date(raw) if raw else business_day(timezone.now())
+    if day is None:
+        return JsonResponse({"error": "day noto'g'ri (YYYY-MM-DD)"}, status=400)
+
+    return JsonResponse(
+        {
+            "day": day.isoformat(),
+            "accounts": [
+                {
+                    "account": {"id": str(c.account_id), "name": c.account.name},
+                    "opening_balance": int(c.opening_balance),
+                    "in_total": int(c.in_total),
+                    "out_total": int(c.out_total),
+                    "closing_balance": int(c.closing_balance),
+                    "by_type": {k: int(getattr(c, k)) for k in CLOSE_TYPE_COLUMNS if getattr(c, k)},
+                }
+                for c in daily_close_report(branch, day)
+            ],
+        }
+    )
 
-# Create your views here.
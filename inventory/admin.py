@@ -2,8 +2,8 @@ from django.contrib import admin, messages
 from django.db.models import Sum
 from django.utils import timezone
 
-from .models import BranchProduct, StockImport, StockImportItem
-from .services import post_stock_import
+from .models import BranchProduct, StockImport, StockImportItem, StockMove
+from .services import adjust_stock, post_stock_import
 
 from users.models import StaffRole
 
@@ -84,6 +84,22 @@ class BranchProductAdmin(admin.ModelAdmin):
     def product_count_type(self, obj):
         return obj.product.count_type
 
+    def save_model(self, request, obj, form, change):
+        # qoldiq o'zgarsa — farq StockMove (ADJUST) sifatida jurnalga yoziladi
+        new_qty = obj.stock_qty
+        if change and "stock_qty" not in form.changed_data:
+            return super().save_model(request, obj, form, change)
+
+        if change:
+            other = [f for f in form.changed_data if f != "stock_qty"]
+            if other:
+                obj.save(update_fields=other)
+        else:
+            obj.stock_qty = 0
+            super().save_model(request, obj, form, change)
+        adjust_stock(obj, new_qty, ref_type="admin")
+        obj.stock_qty = new_qty
+
 
 # ====== IMPORT INLINE ======
 class StockImportItemInline(admin.TabularInline):
@@ -176,3 +192,34 @@ class StockImportAdmin(admin.ModelAdmin):
             obj.branch_id = prof.branch_id
 
         super().save_model(request, obj, form, change)
+
+
+# ====== STOCK LEDGER ======
+@admin.register(StockMove)
+class StockMoveAdmin(admin.ModelAdmin):
+    list_display = ("occurred_at", "branch", "product", "kind", "qty", "unit_cost", "ref_type", "ref_id")
+    list_filter = ("branch", "kind")
+    search_fields = ("product__name", "product__sku", "product__barcode", "ref_id")
+    date_hierarchy = "occurred_at"
+    ordering = ("-occurred_at", "-id")
+    list_select_related = ("branch", "product")
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if _is_owner(request.user):
+            return qs
+        bid = _staff_branch_id(request.user)
+        if not bid:
+            return qs.none()
+        return qs.filter(branch_id=bid)
+
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Branch
+from inventory.services import compute_stock_forecast
+
+
+class Command(BaseCommand):
+    help = (
+        "Sotuv (SALE harakatlari) bo'yicha kunlik sarf va buyurtma tavsiyasini hisoblab "
+        "StockForecast'ga yozadi. Har kecha ishga tushiring; stock_list shu jadvalni o'qiydi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branch", help="Faqat shu Branch id")
+        parser.add_argument("--window", type=int, help="O'rtacha sarf oynasi (kun)")
+        parser.add_argument("--cover", type=int, help="Buyurtma necha kunlik zaxiraga yetsin")
+
+    def handle(self, *args, **options):
+        qs = Branch.objects.order_by("name")
+        if options["branch"]:
+            qs = qs.filter(pk=options["branch"])
+
+        for branch in qs:
+            count = compute_stock_forecast(
+                branch, window_days=options["window"], cover_days=options["cover"],
+            )
+            self.stdout.write(f"{branch.name}: {count} ta mahsulot")
+        self.stdout.write(self.style.SUCCESS("Tayyor."))
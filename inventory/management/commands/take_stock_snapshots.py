@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Branch
+from inventory.services import take_stock_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Har bir filial qoldig'ini snapshot qiladi (point-in-time qoldiq uchun). "
+        "Davriy ishga tushiring (masalan kunda 1 marta). Jurnal bilan farq (drift) bo'lsa ko'rsatadi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branch", help="Faqat shu Branch id")
+
+    def handle(self, *args, **options):
+        qs = Branch.objects.order_by("name")
+        if options["branch"]:
+            qs = qs.filter(pk=options["branch"])
+
+        for branch in qs:
+            as_of, count, drift = take_stock_snapshot(branch)
+            self.stdout.write(f"{branch.name}: {count} ta mahsulot ({as_of:%Y-%m-%d %H:%M:%S})")
+            for product_id, diff in drift.items():
+                self.stdout.write(self.style.WARNING(f"  drift {product_id}: {diff:+}"))
+        self.stdout.write(self.style.SUCCESS("Tayyor."))
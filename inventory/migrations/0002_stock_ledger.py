@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-17 21:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+        ('core', '0001_initial'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMove',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('import', 'Import'), ('sale', 'Sotuv (sarf)'), ('adjust', 'Tuzatish'), ('transfer', "Ko'chirish")], max_length=10)),
+                ('qty', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('unit_cost', models.BigIntegerField(default=0)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ref_type', models.CharField(blank=True, max_length=30, null=True)),
+                ('ref_id', models.UUIDField(blank=True, null=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_moves', to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_moves', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Ombor harakati',
+                'verbose_name_plural': 'Ombor harakatlari',
+                'indexes': [models.Index(fields=['branch', 'product', 'occurred_at'], name='inventory_s_branch__658bde_idx'), models.Index(fields=['branch', 'occurred_at'], name='inventory_s_branch__a2376e_idx'), models.Index(fields=['ref_type', 'ref_id'], name='inventory_s_ref_typ_e0ec78_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('as_of', models.DateTimeField()),
+                ('qty', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Qoldiq snapshot',
+                'verbose_name_plural': 'Qoldiq snapshotlar',
+                'constraints': [models.UniqueConstraint(fields=('branch', 'as_of', 'product'), name='uniq_stock_snapshot_product')],
+            },
+        ),
+    ]
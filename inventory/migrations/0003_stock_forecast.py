@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-17 22:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockForecast',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('daily_qty', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('target_qty', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('window_days', models.PositiveSmallIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('branch_product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='inventory.branchproduct')),
+            ],
+            options={
+                'verbose_name': 'Qoldiq prognozi',
+                'verbose_name_plural': 'Qoldiq prognozlari',
+            },
+        ),
+    ]
@@ -2,6 +2,7 @@
 import uuid
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from core.models import Branch
 from catalog.models import Product
 
@@ -27,6 +28,82 @@ class BranchProduct(models.Model):
         return f"{self.branch} - {self.product}"
 
 
+class StockMove(models.Model):
+    """
+    Ombor harakatlari jurnali (faqat qo'shiladi, o'zgartirilmaydi).
+    qty ishorali: kirim +, chiqim -. BranchProduct.stock_qty — shu jurnalning keshi.
+    """
+    class Kind(models.TextChoices):
+        IMPORT = "import", "Import"
+        SALE = "sale", "Sotuv (sarf)"
+        ADJUST = "adjust", "Tuzatish"
+        TRANSFER = "transfer", "Ko'chirish"
+
+    id = models.BigAutoField(primary_key=True)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="stock_moves")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="stock_moves")
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    qty = models.DecimalField(max_digits=14, decimal_places=3)
+    unit_cost = models.BigIntegerField(default=0)  # so'm (harakat paytidagi)
+
+    occurred_at = models.DateTimeField(default=timezone.now)
+    ref_type = models.CharField(max_length=30, blank=True, null=True)
+    ref_id = models.UUIDField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["branch", "product", "occurred_at"]),
+            models.Index(fields=["branch", "occurred_at"]),
+            models.Index(fields=["ref_type", "ref_id"]),
+        ]
+        verbose_name = "Ombor harakati"
+        verbose_name_plural = "Ombor harakatlari"
+
+    def __str__(self):
+        return f"{self.product_id} {self.qty:+} ({self.kind})"
+
+
+class StockSnapshot(models.Model):
+    """
+    Filial qoldig'ining `as_of` paytidagi nusxasi (har bir BranchProduct uchun bitta qator).
+    `as_of` paytidagi qoldiq = snapshot + (as_of, t] oralig'idagi StockMove'lar.
+    """
+    id = models.BigAutoField(primary_key=True)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="stock_snapshots")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    as_of = models.DateTimeField()
+    qty = models.DecimalField(max_digits=14, decimal_places=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["branch", "as_of", "product"], name="uniq_stock_snapshot_product"),
+        ]
+        verbose_name = "Qoldiq snapshot"
+        verbose_name_plural = "Qoldiq snapshotlar"
+
+    def __str__(self):
+        return f"{self.branch_id} | {self.as_of:%Y-%m-%d %H:%M} | {self.product_id}: {self.qty}"
+
+
+class StockForecast(models.Model):
+    """
+    Sarf tezligi bo'yicha prognoz (har kecha `compute_stock_forecasts` yozadi).
+    daily_qty — kunlik o'rtacha sarf; target_qty — shuncha kunlik zaxira uchun kerakli qoldiq.
+    "Necha kunga yetadi" va buyurtma miqdori stock_list'da joriy stock_qty bilan hisoblanadi.
+    """
+    id = models.BigAutoField(primary_key=True)
+    branch_product = models.OneToOneField(BranchProduct, on_delete=models.CASCADE, related_name="forecast")
+    daily_qty = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    target_qty = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    window_days = models.PositiveSmallIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Qoldiq prognozi"
+        verbose_name_plural = "Qoldiq prognozlari"
+
+    def __str__(self):
+        return f"{self.branch_product_id}: {self.daily_qty}/kun"
 
 
 class StockImport(models.Model):
@@ -1,11 +1,15 @@
 # inventory/services.py
+from datetime import datetime, time, timedelta
 from decimal import Decimal, ROUND_HALF_UP
-from django.db import transaction, IntegrityError
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Sum
+from django.db.models.functions import TruncDate
 
-from .models import StockImport, BranchProduct
+from .models import BranchProduct, StockForecast, StockImport, StockMove, StockSnapshot
+from .signals import stock_changed
 from finance.models import Direction, TxnType
-from finance.services import record_cash_txn
+from finance.services import lock_account_balance, record_cash_txn
 from django.utils import timezone
 Q0 = Decimal("0")
 Q1 = Decimal("1")
@@ -39,11 +43,11 @@ def post_stock_import(stock_import: StockImport, *, by_user=None) -> None:
     if imp.status == StockImport.Status.POSTED:
         return  # idempotent
 
-    items = imp.items.select_related("product").all()
+    items = list(imp.items.only("id", "stock_import", "product", "qty", "line_total_cost"))
     if not items:
         raise ValueError("Import itemlari yo'q. Avval item qo'shing.")
 
-    total_cost = imp.items.aggregate(s=Sum("line_total_cost"))["s"] or 0
+    total_cost = sum(int(it.line_total_cost) for it in items)
     if total_cost < 0:
         raise ValueError("total_cost noto'g'ri")
 
@@ -55,9 +59,10 @@ def post_stock_import(stock_import: StockImport, *, by_user=None) -> None:
         if acc.branch_id != imp.branch_id:
             raise ValueError("paid_from_account boshqa filialga tegishli. To'g'ri account tanlang.")
 
-        # Pul yetarlimi?
-        if acc.balance_cache < int(total_cost):
-            raise ValueError(f"Kassada pul yetarli emas. Balance={acc.balance_cache}, kerak={int(total_cost)}")
+        # Pul yetarlimi? (kassa + striped bo'lsa barcha stripe'lar lock qilinadi)
+        acc, balance = lock_account_balance(acc)
+        if balance < int(total_cost):
+            raise ValueError(f"Kassada pul yetarli emas. Balance={balance}, kerak={int(total_cost)}")
 
         # OUT txn: faqat bir marta yozilishi kerak
         if imp.cash_txn_id is None:
@@ -73,22 +78,40 @@ def post_stock_import(stock_import: StockImport, *, by_user=None) -> None:
             imp.cash_txn = tx
             imp.save(update_fields=["cash_txn"])
 
-    # 2) Stock + cost apply
+    # 2) Stock + cost apply (set-based)
+    # Yo'q BranchProduct'lar oldindan yaratiladi, keyin hammasi bitta tartiblangan
+    # query bilan lock qilinadi (product_id tartibi — deadlock bo'lmasin).
+    product_ids = [it.product_id for it in items]
+    existing = set(
+        BranchProduct.objects.filter(branch_id=imp.branch_id, product_id__in=product_ids)
+        .values_list("product_id", flat=True)
+    )
+    missing = [pid for pid in product_ids if pid not in existing]
+    if missing:
+        BranchProduct.objects.bulk_create(
+            [BranchProduct(branch_id=imp.branch_id, product_id=pid) for pid in missing],
+            ignore_conflicts=True,
+        )
+
+    bps = {
+        bp.product_id: bp
+        for bp in BranchProduct.objects.select_for_update()
+        .filter(branch_id=imp.branch_id, product_id__in=product_ids)
+        .order_by("product_id")
+    }
+
+    now = timezone.now()
+    moves = []
     for it in items:
         unit_cost = _money_div(it.line_total_cost, it.qty)
-
-        bp = (
-            BranchProduct.objects.select_for_update()
-            .filter(branch=imp.branch, product=it.product)
-            .first()
+        bp = bps[it.product_id]
+        moves.append(
+            StockMove(
+                branch_id=imp.branch_id, product_id=it.product_id, kind=StockMove.Kind.IMPORT,
+                qty=it.qty, unit_cost=unit_cost, occurred_at=now, ref_type="stock_import", ref_id=imp.id,
+            )
         )
 
-        if bp is None:
-            try:
-                bp = BranchProduct.objects.create(branch=imp.branch, product=it.product)
-            except IntegrityError:
-                bp = BranchProduct.objects.select_for_update().get(branch=imp.branch, product=it.product)
-
         old_qty = bp.stock_qty
         new_qty = old_qty + it.qty
 
@@ -102,10 +125,163 @@ def post_stock_import(stock_import: StockImport, *, by_user=None) -> None:
         bp.stock_qty = new_qty
         bp.last_unit_cost = unit_cost
         bp.avg_unit_cost = new_avg
-        bp.save(update_fields=["stock_qty", "last_unit_cost", "avg_unit_cost"])
+
+    BranchProduct.objects.bulk_update(list(bps.values()), ["stock_qty", "last_unit_cost", "avg_unit_cost"])
+    StockMove.objects.bulk_create(moves)
+    stock_changed.send(sender=BranchProduct, branch_id=imp.branch_id, product_ids=list(bps))
 
     # 3) Status POSTED
     imp.status = StockImport.Status.POSTED
     imp.posted_by = by_user
-    imp.posted_at = timezone.now()
+    imp.posted_at = now
     imp.save(update_fields=["status", "posted_by", "posted_at"])
+
+
+@transaction.atomic
+def adjust_stock(branch_product: BranchProduct, new_qty: Decimal, *, ref_type: str = "adjust", ref_id=None) -> StockMove | None:
+    """Qoldiqni qo'lda tuzatish (inventarizatsiya): farq ADJUST harakati sifatida yoziladi."""
+    bp = BranchProduct.objects.select_for_update().get(pk=branch_product.pk)
+    diff = Decimal(new_qty) - bp.stock_qty
+    if not diff:
+        return None
+    bp.stock_qty = Decimal(new_qty)
+    bp.save(update_fields=["stock_qty"])
+    stock_changed.send(sender=BranchProduct, branch_id=bp.branch_id, product_ids=[bp.product_id])
+    return StockMove.objects.create(
+        branch_id=bp.branch_id, product_id=bp.product_id, kind=StockMove.Kind.ADJUST,
+        qty=diff, unit_cost=bp.avg_unit_cost, ref_type=ref_type, ref_id=ref_id,
+    )
+
+
+def _moves_sum(branch_id, *, after=None, until=None, product_ids=None) -> dict:
+    qs = StockMove.objects.filter(branch_id=branch_id)
+    if after is not None:
+        qs = qs.filter(occurred_at__gt=after)
+    if until is not None:
+        qs = qs.filter(occurred_at__lte=until)
+    if product_ids is not None:
+        qs = qs.filter(product_id__in=product_ids)
+    return dict(qs.values("product_id").annotate(s=Sum("qty")).values_list("product_id", "s"))
+
+
+def stock_at(branch, at, *, product_ids=None) -> dict:
+    """
+    {product_id: qty} — `at` paytidagi qoldiq: eng yaqin snapshot + (as_of, at] harakatlar.
+    Snapshot yo'q bo'lsa — jurnal boshidan (jurnal yozilishidan oldingi qoldiq hisobga olinmaydi).
+    """
+    as_of = (
+        StockSnapshot.objects.filter(branch=branch, as_of__lte=at)
+        .order_by("-as_of").values_list("as_of", flat=True).first()
+    )
+    out: dict = {}
+    if as_of is not None:
+        snap = StockSnapshot.objects.filter(branch=branch, as_of=as_of)
+        if product_ids is not None:
+            snap = snap.filter(product_id__in=product_ids)
+        out = dict(snap.values_list("product_id", "qty"))
+    for pid, qty in _moves_sum(branch.pk, after=as_of, until=at, product_ids=product_ids).items():
+        out[pid] = out.get(pid, Q0) + (qty or Q0)
+    return out
+
+
+@transaction.atomic
+def take_stock_snapshot(branch) -> tuple:
+    """
+    Filialning joriy qoldig'ini snapshot qiladi. BranchProduct'lar product_id tartibida
+    lock qilinadi — yarim yozilgan harakatlar snapshotga tushmaydi.
+
+    (as_of, yozilgan qatorlar soni, drift) qaytaradi. drift — {product_id: farq}:
+    oldingi snapshot + jurnal bo'yicha kutilgan qoldiq va haqiqiy stock_qty farqi.
+    """
+    current = dict(
+        BranchProduct.objects.select_for_update()
+        .filter(branch=branch)
+        .order_by("product_id")
+        .values_list("product_id", "stock_qty")
+    )
+    as_of = timezone.now()
+
+    drift = {}
+    prev = StockSnapshot.objects.filter(branch=branch).order_by("-as_of").values_list("as_of", flat=True).first()
+    if prev is not None:
+        expected = stock_at(branch, as_of)
+        for pid in set(current) | set(expected):
+            diff = current.get(pid, Q0) - expected.get(pid, Q0)
+            if diff:
+                drift[pid] = diff
+
+    StockSnapshot.objects.bulk_create(
+        [StockSnapshot(branch=branch, product_id=pid, as_of=as_of, qty=qty) for pid, qty in current.items()]
+    )
+    return as_of, len(current), drift
+
+
+# ====== SARF PROGNOZI ======
+FORECAST_SHORT_DAYS = 7
+Q001 = Decimal("0.001")
+
+
+def _daily_consumption(branch_id, first_day, days: int) -> dict:
+    """
+    {product_id: [kunlik sarf, ...]} — first_day'dan boshlab `days` kunlik qator
+    (sotuv bo'lmagan kun 0). Bitta GROUP BY (product, kun) query; manba — SALE harakatlari.
+    """
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    end = start + timedelta(days=days)
+    rows = (
+        StockMove.objects.filter(
+            branch_id=branch_id, kind=StockMove.Kind.SALE,
+            occurred_at__gte=start, occurred_at__lt=end,
+        )
+        .annotate(day=TruncDate("occurred_at"))
+        .values("product_id", "day")
+        .annotate(s=Sum("qty"))
+        .values_list("product_id", "day", "s")
+    )
+    matrix: dict = {}
+    for product_id, day, s in rows:
+        i = (day - first_day).days
+        if 0 <= i < days:
+            series = matrix.setdefault(product_id, [Q0] * days)
+            series[i] -= s or Q0  # SALE qty manfiy
+    return matrix
+
+
+def compute_stock_forecast(branch, *, today=None, window_days: int | None = None, cover_days: int | None = None) -> int:
+    """
+    Filial mahsulotlari uchun StockForecast'ni qayta yozadi (bugungacha bo'lgan to'liq kunlar bo'yicha).
+
+    Kunlik sarf = max(oxirgi `window_days` o'rtachasi, oxirgi 7 kun o'rtachasi) —
+    sotuv o'sayotgan bo'lsa qisqa oyna tezroq sezadi. target_qty = daily_qty * cover_days.
+    Yozilgan qatorlar sonini qaytaradi.
+    """
+    window_days = window_days or settings.STOCK_FORECAST_WINDOW_DAYS
+    cover_days = settings.STOCK_REORDER_COVER_DAYS if cover_days is None else cover_days
+    short_days = min(FORECAST_SHORT_DAYS, window_days)
+    today = today or timezone.localdate()
+    matrix = _daily_consumption(branch.pk, today - timedelta(days=window_days), window_days)
+
+    now = timezone.now()
+    rows = []
+    for bp_id, product_id in BranchProduct.objects.filter(branch=branch).values_list("id", "product_id"):
+        series = matrix.get(product_id)
+        daily = Q0
+        if series:
+            daily = max(sum(series) / window_days, sum(series[-short_days:]) / short_days)
+            daily = daily.quantize(Q001, rounding=ROUND_HALF_UP)
+        rows.append(StockForecast(
+            branch_product_id=bp_id,
+            daily_qty=daily,
+            target_qty=(daily * cover_days).quantize(Q001, rounding=ROUND_HALF_UP),
+            window_days=window_days,
+            computed_at=now,
+        ))
+
+    StockForecast.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["branch_product"],
+        update_fields=["daily_qty", "target_qty", "window_days", "computed_at"],
+    )
+    return len(rows)
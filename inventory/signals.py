@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# BranchProduct.stock_qty o'zgardi (import, sotuv, tuzatish).
+# kwargs: branch_id, product_ids. Tranzaksiya ichida yuboriladi — qabul qiluvchi
+# og'ir ishni transaction.on_commit ga qoldirsin.
+stock_changed = Signal()
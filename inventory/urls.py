@@ -7,6 +7,7 @@ urlpatterns = [
     # TAB 1: mahsulotlar (qoldiq)
     path("ombor/mahsulotlar/", views.stock_list, name="stock_list"),
     path("ombor/mahsulotlar/yangi/", views.product_create, name="product_create"),
+    path("ombor/mahsulotlar/skaner/", views.product_scan, name="product_scan"),
     path("ombor/mahsulotlar/<uuid:pk>/", views.product_detail, name="product_detail"),
 
     # TAB 2: importlar
@@ -1,13 +1,15 @@
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Sum, Q
-from django.http import HttpResponseForbidden
+from django.db.models import BigIntegerField, Case, DecimalField, ExpressionWrapper, F, Func, Q, Sum, Value, When
+from django.http import HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_http_methods, require_POST
 
 from catalog.models import Product
+from catalog.services import find_product_by_code, search_products
+from core.pagination import keyset_page, page_size
 from .forms import StockImportCreateForm, StockImportItemForm, ProductCreateForm
 from .models import BranchProduct, StockImport, StockImportItem
 from .services import post_stock_import
@@ -24,6 +26,16 @@ def _branch_or_forbidden(request):
     return b
 
 
+class _UnitCost(Func):
+    """
+    Birlik tannarx SQL'da: ROUND(line_total_cost / qty), 0.5 yuqoriga.
+    1.0 * — SQLite butun sonli qty'da butun bo'lishni qilmasin (Postgres'da numeric).
+    """
+    template = "CAST(ROUND(1.0 * %(expressions)s) AS BIGINT)"
+    arg_joiner = " / "
+    output_field = BigIntegerField()
+
+
 def _ordering(request, allowed: dict, default_key: str):
     """
     allowed: {"name": "product__name", "qty": "stock_qty", ...}
@@ -57,18 +69,40 @@ def stock_list(request):
         "qty": "stock_qty",
         "avg": "avg_unit_cost",
         "last": "last_unit_cost",
+        "days": "days_left",
+        "reorder": "reorder_qty",
     }
     ordering, current_o = _ordering(request, allowed, "name")
 
-    qs = BranchProduct.objects.filter(branch=branch).select_related("product")
+    # prognoz (StockForecast) kechasi hisoblanadi — bu yerda faqat LEFT JOIN + joriy qoldiq
+    qty_field = DecimalField(max_digits=14, decimal_places=3)
+    qs = (
+        BranchProduct.objects.filter(branch=branch)
+        .select_related("product", "forecast")
+        .annotate(
+            days_left=Case(
+                When(
+                    forecast__daily_qty__gt=0,
+                    then=ExpressionWrapper(F("stock_qty") / F("forecast__daily_qty"), output_field=qty_field),
+                ),
+                default=None,
+                output_field=qty_field,
+            ),
+            reorder_qty=Case(
+                When(
+                    forecast__target_qty__gt=F("stock_qty"),
+                    then=ExpressionWrapper(F("forecast__target_qty") - F("stock_qty"), output_field=qty_field),
+                ),
+                default=Value(0),
+                output_field=qty_field,
+            ),
+        )
+    )
     qs = qs.filter(product__is_active=True)
 
     if q:
-        qs = qs.filter(
-            Q(product__name__icontains=q) |
-            Q(product__sku__icontains=q) |
-            Q(product__barcode__icontains=q)
-        )
+        # aniq shtrix-kod/SKU — unique indeks; aks holda search_text (Postgres'da trigram)
+        qs = search_products(qs, q, prefix="product__")
     if ct:
         qs = qs.filter(product__count_type=ct)
 
@@ -81,6 +115,10 @@ def stock_list(request):
     except Exception:
         pass
 
+    if ordering.lstrip("-") == "days_left":
+        # sarfi yo'q mahsulotlar (NULL) har doim oxirida
+        days = F("days_left")
+        ordering = days.desc(nulls_last=True) if ordering.startswith("-") else days.asc(nulls_last=True)
     qs = qs.order_by(ordering, "product__name")
 
     return render(request, "inventory/stock_list.html", {
@@ -94,6 +132,32 @@ def stock_list(request):
     })
 
 
+@login_required
+def product_scan(request):
+    """
+    Ombor skaneri: ?code=<shtrix-kod yoki SKU> — aniq moslik (unique indekslar), JSON.
+    Topilmasa 404.
+    """
+    branch = _branch_or_forbidden(request)
+    product = find_product_by_code(request.GET.get("code"))
+    if product is None:
+        return JsonResponse({"error": "not_found"}, status=404)
+
+    stock = (
+        BranchProduct.objects.filter(branch=branch, product=product)
+        .values_list("stock_qty", flat=True).first()
+    )
+    return JsonResponse({
+        "id": str(product.id),
+        "name": product.name,
+        "sku": product.sku,
+        "barcode": product.barcode,
+        "count_type": product.count_type,
+        "is_active": product.is_active,
+        "stock_qty": str(stock if stock is not None else Decimal("0")),
+    })
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def product_create(request):
@@ -122,41 +186,39 @@ def product_detail(request, pk):
     # Product UUID
     product = get_object_or_404(Product, pk=pk)
 
-    bp, _ = BranchProduct.objects.get_or_create(branch=branch, product=product)
-
-    # import tarixini shu product + shu branch bo‘yicha ko‘rsatamiz
-    items = (
-        StockImportItem.objects
-        .filter(product=product, stock_import__branch=branch)
-        .select_related("stock_import")
-        .order_by("-stock_import__created_at")
+    # o'qish sahifasida yozuv yo'q: BranchProduct product_create / post_stock_import'da yaratiladi
+    bp = (
+        BranchProduct.objects.filter(branch=branch, product=product).first()
+        or BranchProduct(branch=branch, product=product)
     )
 
-    total_qty = items.aggregate(s=Sum("qty"))["s"] or Decimal("0")
-    total_cost = items.aggregate(s=Sum("line_total_cost"))["s"] or 0
+    # import tarixini shu product + shu branch bo‘yicha ko‘rsatamiz
+    items = StockImportItem.objects.filter(product=product, stock_import__branch=branch)
+    totals = items.aggregate(qty=Sum("qty"), cost=Sum("line_total_cost"))
 
-    rows = []
-    for it in items[:300]:
-        qty = it.qty
-        if qty and qty > 0:
-            unit = (Decimal(it.line_total_cost) / qty).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
-            unit = int(unit)
-        else:
-            unit = 0
-        rows.append({
-            "import": it.stock_import,
-            "qty": it.qty,
-            "line_total_cost": it.line_total_cost,
-            "unit_cost": unit,
-        })
+    unit_cost = Case(
+        When(qty__gt=0, then=_UnitCost("line_total_cost", "qty")),
+        default=Value(0),
+        output_field=BigIntegerField(),
+    )
+    try:
+        rows, next_cursor = keyset_page(
+            items.select_related("stock_import").annotate(unit_cost=unit_cost),
+            cursor=(request.GET.get("cursor") or "").strip() or None,
+            limit=page_size(request.GET.get("limit")),
+            keys=("stock_import__created_at", "id"),
+        )
+    except ValueError:
+        return redirect("product_detail", pk=product.pk)
 
     return render(request, "inventory/product_detail.html", {
         "tab": "products",
         "product": product,
         "bp": bp,
         "import_rows": rows,
-        "total_import_qty": total_qty,
-        "total_import_cost": total_cost,
+        "next_cursor": next_cursor,
+        "total_import_qty": totals["qty"] or Decimal("0"),
+        "total_import_cost": totals["cost"] or 0,
     })
 
 
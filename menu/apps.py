@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MenuConfig(AppConfig):
     name = 'menu'
     verbose_name = "Taomlar"
+
+    def ready(self):
+        # signals
+        from . import signals  # noqa: F401
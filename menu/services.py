@@ -0,0 +1,381 @@
+# menu/services.py
+"""
+Flattened recipe ("BOM") cache.
+
+Har bir Food uchun 1 dona sotuvga kerak bo'lgan ingredientlar: {product_id: qty}.
+SET'lar SetItem orqali oxirgi Product'largacha yoyiladi.
+
+Ikki qavatli kesh:
+  - process ichidagi LRU (eng tez, DB/cache'ga bormaydi)
+  - Django cache (process'lar o'rtasida umumiy: Redis yoki DB kesh, settings.CACHES)
+Kalitlar global "BOM versiya"si bilan; Food/FoodItem/SetItem o'zgarsa versiya
+commit'dan keyin oshiriladi (menu.signals) va eski yozuvlar o'z-o'zidan eskiradi.
+Versiya har chaqiruvda umumiy keshdan o'qiladi — LRU yozuvlari ham boshqa process'dagi
+o'zgarishdan keyin eskiradi.
+
+POS menu snapshot ham shu uslubda: filial "menu versiya"si bilan keshlanadi.
+
+"Sotsa bo'ladigan miqdor" (sellable): har bir Food uchun min(stock_qty / need) —
+filial + BOM versiyasi bo'yicha Food'ma-Food keshlanadi. Stock o'zgarganda
+(inventory.signals.stock_changed) faqat o'sha mahsulotlar ishlatilgan Food'lar qayta hisoblanadi
+(mahsulot -> Food teskari indeksi orqali, menyu BOM'lari har safar yoyilmaydi).
+Sellable o'z versiyasi/ETag'iga ega — har sotuv menu snapshot ETag'ini eskirtirmaydi.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import Food, FoodItem, FoodType, SetItem
+
+BOM_VERSION_KEY = "menu:bom:version"
+BOM_CACHE_TIMEOUT = 60 * 60 * 24
+MENU_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+LOCAL_LRU_SIZE = 2048
+
+_local_lru: OrderedDict = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _bom_key(version: int, food_id) -> str:
+    return f"menu:bom:{version}:{food_id}"
+
+
+def _cache_version(key: str) -> int:
+    """
+    Cache'dagi versiya hisoblagichi. Kalit yo'qolsa (eviction/restart) vaqtdan
+    boshlanadi — eski versiyali yozuvlar bilan to'qnashmasin.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key) or int(time.time() * 1000)
+    return int(version)
+
+
+def _bump_cache_version(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def bom_version() -> int:
+    return _cache_version(BOM_VERSION_KEY)
+
+
+def bump_bom_version() -> None:
+    """Barcha BOM yozuvlarini eskirtiradi (retsept yoki Food o'zgarganda)."""
+    _bump_cache_version(BOM_VERSION_KEY)
+
+
+def _local_get(key):
+    with _local_lock:
+        if key not in _local_lru:
+            return False, None
+        _local_lru.move_to_end(key)
+        return True, _local_lru[key]
+
+
+def _local_put(key, value) -> None:
+    with _local_lock:
+        _local_lru[key] = value
+        _local_lru.move_to_end(key)
+        while len(_local_lru) > LOCAL_LRU_SIZE:
+            _local_lru.popitem(last=False)
+
+
+def _build_boms(food_ids) -> dict:
+    """
+    DB'dan BOM quradi: Food, SetItem va FoodItem — har biri bitta query.
+    Tarkibi bo'sh SET uchun None qaytaradi (sotuvda xato sifatida ko'rsatiladi).
+    """
+    types = dict(Food.objects.filter(id__in=food_ids).values_list("id", "type"))
+
+    components: dict = {}  # {food_id: {component_food_id: qty}}
+    set_ids = [fid for fid, t in types.items() if t == FoodType.SET]
+    for si in SetItem.objects.filter(set_food_id__in=set_ids).values("set_food_id", "food_id", "qty"):
+        comp = components.setdefault(si["set_food_id"], {})
+        comp[si["food_id"]] = comp.get(si["food_id"], 0) + int(si["qty"])
+    for fid, t in types.items():
+        if t != FoodType.SET:
+            components[fid] = {fid: 1}
+
+    recipe_food_ids = {cid for comp in components.values() for cid in comp}
+    recipes: dict = {}
+    for ri in FoodItem.objects.filter(food_id__in=recipe_food_ids).values("food_id", "product_id", "qty"):
+        recipes.setdefault(ri["food_id"], []).append((ri["product_id"], ri["qty"]))
+
+    out: dict = {}
+    for fid in types:
+        if fid not in components:
+            out[fid] = None
+            continue
+        bom: dict = {}
+        for cid, mult in components[fid].items():
+            for product_id, qty in recipes.get(cid, ()):
+                bom[product_id] = bom.get(product_id, Decimal("0")) + qty * mult
+        out[fid] = bom
+    return out
+
+
+def get_food_boms(food_ids) -> dict:
+    """
+    {food_id: {product_id: qty} | None} — 1 dona uchun yoyilgan retsept.
+
+    Avval process LRU, keyin umumiy cache, oxirida DB (faqat yetishmaganlar uchun).
+    Qaytarilgan dict'larni o'zgartirmang — ular keshda umumiy.
+    """
+    food_ids = list(dict.fromkeys(food_ids))
+    if not food_ids:
+        return {}
+
+    version = bom_version()
+    out: dict = {}
+    misses = []
+    for fid in food_ids:
+        hit, bom = _local_get((version, fid))
+        if hit:
+            out[fid] = bom
+        else:
+            misses.append(fid)
+
+    if misses:
+        shared = cache.get_many([_bom_key(version, fid) for fid in misses])
+        still_missing = []
+        for fid in misses:
+            key = _bom_key(version, fid)
+            if key in shared:
+                out[fid] = shared[key]
+                _local_put((version, fid), shared[key])
+            else:
+                still_missing.append(fid)
+
+        if still_missing:
+            built = _build_boms(still_missing)
+            cache.set_many(
+                {_bom_key(version, fid): bom for fid, bom in built.items()},
+                timeout=BOM_CACHE_TIMEOUT,
+            )
+            for fid, bom in built.items():
+                out[fid] = bom
+                _local_put((version, fid), bom)
+
+    return out
+
+
+def get_food_bom(food_id) -> dict | None:
+    return get_food_boms([food_id]).get(food_id)
+
+
+# =====================
+# POS MENU SNAPSHOT
+# =====================
+def _menu_version_key(branch_id) -> str:
+    return f"menu:branch:{branch_id}:version"
+
+
+def menu_version(branch_id) -> int:
+    return _cache_version(_menu_version_key(branch_id))
+
+
+def bump_menu_version(branch_id) -> None:
+    """Filial menyusi o'zgardi (Food/FoodCategory) — snapshot va ETag eskiradi."""
+    if branch_id:
+        _bump_cache_version(_menu_version_key(branch_id))
+
+
+def menu_etag(branch_id) -> str:
+    return f'"menu-{branch_id}-{menu_version(branch_id)}"'
+
+
+def _food_image_url(f) -> str | None:
+    try:
+        if f.image:
+            return f.image.url
+    except Exception:
+        return None
+    return None
+
+
+def _build_menu_snapshot(branch_id, version: int) -> dict:
+    foods_qs = (
+        Food.objects.filter(is_active=True, branch_id=branch_id)
+        .order_by("type", "category__sort_order", "sort_order", "name")
+    )
+    foods = [
+        {
+            "id": str(f.id),
+            "name": f.name,
+            "type": f.type,
+            "sell_price": int(f.sell_price),
+            "image": _food_image_url(f),
+        }
+        for f in foods_qs
+    ]
+    return {
+        "version": version,
+        "foods": foods,
+        # bir marta serialize qilinadi: template ham, JSON endpoint ham shuni beradi
+        "foods_json": json.dumps(foods, ensure_ascii=False),
+        "payload_json": json.dumps(
+            {"branch": str(branch_id), "version": version, "foods": foods},
+            ensure_ascii=False,
+        ),
+    }
+
+
+def get_menu_snapshot(branch_id) -> dict:
+    """
+    Filialning aktiv menyusi: {"version", "foods", "foods_json", "payload_json"}.
+    Menu versiya o'zgarmaguncha DB'ga qayta bormaydi.
+    """
+    version = menu_version(branch_id)
+    key = f"menu:snapshot:{branch_id}:{version}"
+
+    hit, snap = _local_get(key)
+    if hit:
+        return snap
+
+    snap = cache.get(key)
+    if snap is None:
+        snap = _build_menu_snapshot(branch_id, version)
+        cache.set(key, snap, timeout=MENU_SNAPSHOT_TIMEOUT)
+    _local_put(key, snap)
+    return snap
+
+
+# =====================
+# SELLABLE QTY (stock bo'yicha)
+# =====================
+SELLABLE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _as_uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def _sellable_version_key(branch_id) -> str:
+    return f"menu:sellable:{branch_id}:version"
+
+
+def sellable_version(branch_id) -> int:
+    return _cache_version(_sellable_version_key(branch_id))
+
+
+def sellable_etag(branch_id) -> str:
+    return f'"sellable-{branch_id}-{sellable_version(branch_id)}"'
+
+
+def _sellable_key(branch_id, bom_v: int, food_id) -> str:
+    return f"menu:sellable:{branch_id}:{bom_v}:{food_id}"
+
+
+def _product_food_index(branch_id) -> dict:
+    """
+    {product_id: (food_id, ...)} — filial aktiv menyusi bo'yicha teskari indeks.
+    Menu yoki BOM versiyasi o'zgarmaguncha keshdan olinadi (LRU, keyin umumiy cache).
+    """
+    key = f"menu:sellable:index:{branch_id}:{menu_version(branch_id)}:{bom_version()}"
+    hit, index = _local_get(key)
+    if hit:
+        return index
+
+    index = cache.get(key)
+    if index is None:
+        food_ids = [_as_uuid(f["id"]) for f in get_menu_snapshot(branch_id)["foods"]]
+        grouped: dict = {}
+        for food_id, bom in get_food_boms(food_ids).items():
+            for product_id in bom or ():
+                grouped.setdefault(product_id, []).append(food_id)
+        index = {pid: tuple(fids) for pid, fids in grouped.items()}
+        cache.set(key, index, timeout=MENU_SNAPSHOT_TIMEOUT)
+    _local_put(key, index)
+    return index
+
+
+def _compute_sellable(branch_id, boms: dict) -> dict:
+    """
+    {food_id: int | None} — bitta BranchProduct query bilan.
+    None — retsepti yo'q Food (stock bilan cheklanmaydi); bo'sh SET — 0.
+    """
+    from inventory.models import BranchProduct
+
+    product_ids = {pid for bom in boms.values() if bom for pid in bom}
+    stock = dict(
+        BranchProduct.objects.filter(branch_id=branch_id, product_id__in=product_ids)
+        .values_list("product_id", "stock_qty")
+    )
+    out = {}
+    for food_id, bom in boms.items():
+        if bom is None:
+            out[food_id] = 0
+            continue
+        qty = None
+        for product_id, need in bom.items():
+            if need > 0:
+                fit = max(0, int(stock.get(product_id, Decimal("0")) // need))
+                qty = fit if qty is None else min(qty, fit)
+        out[food_id] = qty
+    return out
+
+
+def get_sellable(branch_id, food_ids) -> dict:
+    """{food_id: int | None}; keshda yo'qlari bitta query bilan hisoblanadi."""
+    food_ids = list(dict.fromkeys(_as_uuid(fid) for fid in food_ids))
+    if not food_ids:
+        return {}
+    bom_v = bom_version()
+    keys = {fid: _sellable_key(branch_id, bom_v, fid) for fid in food_ids}
+    cached = cache.get_many(list(keys.values()))
+
+    out = {fid: cached[k] for fid, k in keys.items() if k in cached}
+    missing = [fid for fid in food_ids if fid not in out]
+    if missing:
+        fresh = _compute_sellable(branch_id, get_food_boms(missing))
+        cache.set_many({keys[fid]: q for fid, q in fresh.items()}, timeout=SELLABLE_CACHE_TIMEOUT)
+        out.update(fresh)
+    return out
+
+
+def refresh_sellable(branch_id, product_ids) -> int:
+    """
+    Stock o'zgargan mahsulotlar ishlatilgan Food'lar uchungina sellable qayta hisoblanadi.
+    Qayta hisoblangan Food'lar sonini qaytaradi.
+    """
+    index = _product_food_index(branch_id)
+    food_ids = {fid for pid in product_ids for fid in index.get(pid, ())}
+    if not food_ids:
+        return 0
+    affected = get_food_boms(food_ids)
+
+    bom_v = bom_version()
+    fresh = _compute_sellable(branch_id, affected)
+    cache.set_many(
+        {_sellable_key(branch_id, bom_v, fid): q for fid, q in fresh.items()},
+        timeout=SELLABLE_CACHE_TIMEOUT,
+    )
+    _bump_cache_version(_sellable_version_key(branch_id))
+    return len(fresh)
+
+
+def sellable_payload_json(branch_id) -> str:
+    """POS sellable JSON: {"branch", "version", "sellable": {food_id: int | None}}."""
+    version = sellable_version(branch_id)
+    snap = get_menu_snapshot(branch_id)
+    sellable = get_sellable(branch_id, [f["id"] for f in snap["foods"]])
+    return json.dumps(
+        {
+            "branch": str(branch_id),
+            "version": version,
+            "sellable": {str(fid): qty for fid, qty in sellable.items()},
+        },
+        ensure_ascii=False,
+    )
+
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventory.signals import stock_changed
+
+from .models import Food, FoodCategory, FoodItem, SetItem
+from .services import bump_bom_version, bump_menu_version, refresh_sellable
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+@receiver(post_save, sender=SetItem)
+@receiver(post_delete, sender=SetItem)
+def invalidate_food_boms(sender, **kwargs):
+    """
+    Retsept yoki Food o'zgarsa — yoyilgan BOM keshi eskiradi.
+    Commit'dan keyin: aks holda boshqa process yangi versiya ostida eski retseptni keshlab qo'yadi.
+    """
+    transaction.on_commit(bump_bom_version)
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+@receiver(post_save, sender=FoodCategory)
+@receiver(post_delete, sender=FoodCategory)
+def invalidate_menu_snapshot(sender, instance, **kwargs):
+    """Filial menyusi o'zgarsa — POS snapshot va ETag yangilanadi (commit'dan keyin)."""
+    branch_id = instance.branch_id
+    transaction.on_commit(lambda: bump_menu_version(branch_id))
+
+
+@receiver(stock_changed)
+def refresh_sellable_on_stock_change(sender, branch_id, product_ids, **kwargs):
+    """Stock o'zgarsa — faqat o'sha mahsulotlar ishlatilgan Food'lar sellable qayta hisoblanadi."""
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: refresh_sellable(branch_id, product_ids), robust=True)
+
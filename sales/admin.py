@@ -3,8 +3,8 @@ from django.contrib import admin, messages
 from django.db import transaction
 from django.utils import timezone
 
-from .models import Order, OrderItem, OrderPayment
-from .services import recalc_order_totals, apply_stock_for_order_if_needed
+from .models import Order, OrderEvent, OrderItem, OrderPayment, StockApplyJob
+from .services import recalc_order_totals, apply_stock_for_order_if_needed, emit_order_event
 from finance.models import Direction, TxnType
 from finance.services import record_cash_txn
 
@@ -134,11 +134,7 @@ class OrderAdmin(admin.ModelAdmin):
         if getattr(order, "is_locked", False):
             return
 
-        # 1) totals
-        recalc_order_totals(order)
-        order.refresh_from_db()
-
-        # 2) cash_txn yo'q paymentlar uchun kassaga yozuv yarat
+        # 1) cash_txn yo'q paymentlar uchun kassaga yozuv yarat
         created_cnt = 0
         payments = (
             order.payments
@@ -168,7 +164,8 @@ class OrderAdmin(admin.ModelAdmin):
         if created_cnt:
             self.message_user(request, f"{created_cnt} ta payment uchun cash_txn yaratildi.", level=messages.SUCCESS)
 
-        # 3) totals/status
+        # 2) totals/status — inline editlar service'larni chetlab o'tadi,
+        # shuning uchun bu yerda to'liq qayta hisoblash (tuzatish yo'li) qoladi.
         recalc_order_totals(order)
         order.refresh_from_db()
 
@@ -178,11 +175,35 @@ class OrderAdmin(admin.ModelAdmin):
                 order.paid_at = order.paid_at or timezone.now()
                 order.paid_by = order.paid_by or request.user
                 order.save(update_fields=["status", "paid_at", "paid_by"])
+                emit_order_event(order, OrderEvent.Kind.PAID)
 
-            # 4) stock apply (idempotent) — faqat topshirilgan bo‘lsa
+            # 3) stock apply (idempotent) — faqat topshirilgan bo‘lsa
             if getattr(order, "is_delivered", False):
                 apply_stock_for_order_if_needed(order)
         else:
             # PAID'ni qaytarish mumkin emas (cash+stock buziladi)
             if order.status == Order.Status.PAID:
                 raise ValueError("PAID orderni qaytadan DRAFT qilish mumkin emas.")
+
+
+@admin.register(StockApplyJob)
+class StockApplyJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "branch", "order", "attempts", "last_error", "created_at")
+    list_filter = ("branch",)
+    ordering = ("id",)
+    list_select_related = ("branch",)
+    readonly_fields = ("branch", "order", "last_error", "created_at")
+    fields = ("branch", "order", "attempts", "last_error", "created_at")  # attempts=0 — qayta urinish
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if _is_owner(request.user):
+            return qs
+        bid = _staff_branch_id(request.user)
+        if not bid:
+            return qs.none()
+        return qs.filter(branch_id=bid)
+
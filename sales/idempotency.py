@@ -0,0 +1,107 @@
+# sales/idempotency.py
+import hashlib
+import json
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FORM_FIELD = "idempotency_key"  # HTML formalar header yubora olmaydi
+
+STORED_HEADERS = ("Content-Type", "Location")
+
+# forma qayta yuborilganda o'zgarishi mumkin bo'lgan, mazmunga aloqasi yo'q maydonlar
+FINGERPRINT_IGNORED_FIELDS = {"csrfmiddlewaretoken", IDEMPOTENCY_FORM_FIELD}
+
+
+def _request_hash(request) -> str:
+    """So'rov mazmuni hash'i: forma — maydonlar (tartiblangan), boshqasi — xom body."""
+    if request.content_type in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        fields = sorted(
+            (name, value)
+            for name in request.POST
+            if name not in FINGERPRINT_IGNORED_FIELDS
+            for value in request.POST.getlist(name)
+        )
+        raw = json.dumps(fields, ensure_ascii=False).encode()
+    else:
+        raw = request.body
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _same_request(rec: IdempotencyKey, path: str, request_hash: str) -> bool:
+    # eski yozuvlarda (maydonlar qo'shilishidan oldin) fingerprint yo'q
+    if not rec.request_hash:
+        return True
+    return rec.request_path == path and rec.request_hash == request_hash
+
+
+def _replay(rec: IdempotencyKey) -> HttpResponse:
+    response = HttpResponse(rec.response_body, status=rec.status_code)
+    for name, value in (rec.response_headers or {}).items():
+        response[name] = value
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(scope: str):
+    """
+    POST view'ni Idempotency-Key bilan himoyalaydi.
+
+    - kalit yo'q -> oddiy ishlaydi
+    - kalit yangi -> view bajariladi, javob saqlanadi (5xx/exception saqlanmaydi)
+    - kalit bor, javob saqlangan -> saqlangan javob, view chaqirilmaydi
+    - kalit bor, hali bajarilmoqda -> 409
+    - kalit bor, lekin boshqa so'rov (path yoki body farq qiladi) -> 422, hech narsa qaytarilmaydi
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method != "POST":
+                return view(request, *args, **kwargs)
+
+            key = (request.headers.get(IDEMPOTENCY_HEADER) or request.POST.get(IDEMPOTENCY_FORM_FIELD) or "").strip()
+            if not key:
+                return view(request, *args, **kwargs)
+            if len(key) > 100:
+                return HttpResponseBadRequest("Idempotency-Key juda uzun")
+
+            user = request.user if request.user.is_authenticated else None
+            path = request.path[:255]
+            request_hash = _request_hash(request)
+            try:
+                # alohida (qisqa) tranzaksiya: parallel dublikat kalitni darhol ko'rsin
+                with transaction.atomic():
+                    rec = IdempotencyKey.objects.create(
+                        user=user, scope=scope, key=key, request_path=path, request_hash=request_hash,
+                    )
+            except IntegrityError:
+                rec = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+                if rec is not None and not _same_request(rec, path, request_hash):
+                    return JsonResponse({"error": "idempotency_key_reused"}, status=422)
+                if rec is None or rec.status_code is None:
+                    return JsonResponse({"error": "request_in_progress"}, status=409)
+                return _replay(rec)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                rec.delete()
+                raise
+
+            if response.status_code >= 500 or getattr(response, "streaming", False):
+                rec.delete()
+                return response
+
+            rec.status_code = response.status_code
+            rec.response_headers = {h: response[h] for h in STORED_HEADERS if response.has_header(h)}
+            rec.response_body = response.content.decode(response.charset or "utf-8", errors="replace")
+            rec.save(update_fields=["status_code", "response_headers", "response_body"])
+            return response
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,119 @@
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test.utils import override_settings
+
+from catalog.models import Product
+from core.models import Branch
+from inventory.models import BranchProduct, StockMove
+from menu.models import Food, FoodItem, FoodType
+from sales.models import Order, OrderEvent
+from sales.services import STOCK_MODE_CONDITIONAL, STOCK_MODE_LOCK, create_order_with_items, mark_delivered
+
+MODES = (STOCK_MODE_LOCK, STOCK_MODE_CONDITIONAL)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stock yechish rejimlarini (lock / conditional) parallel topshirishda solishtiradi. "
+        "Vaqtinchalik filial yaratadi va oxirida o'chiradi. Faqat staging/test DB'da (PostgreSQL) ishlating."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=200, help="Har bir rejim uchun orderlar soni")
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--products", type=int, default=4, help="Burgerdagi ingredientlar soni (umumiy qatorlar)")
+        parser.add_argument("--mode", choices=MODES + ("both",), default="both")
+        parser.add_argument("--keep", action="store_true", help="Test ma'lumotlarini o'chirmaslik")
+
+    def handle(self, *args, **options):
+        if connection.vendor == "sqlite":
+            self.stdout.write(self.style.WARNING("SQLite yozuvlarni ketma-ket bajaradi — natija ko'rsatkich emas."))
+        if options["threads"] < 1 or options["orders"] < 1:
+            raise CommandError("--threads va --orders > 0 bo'lishi kerak")
+
+        branch, food, product_ids = self._setup(options["products"])
+        try:
+            modes = MODES if options["mode"] == "both" else (options["mode"],)
+            for mode in modes:
+                self._run(mode, branch, food, product_ids, options["orders"], options["threads"])
+        finally:
+            if not options["keep"]:
+                self._cleanup(branch, product_ids)
+
+    def _setup(self, n_products):
+        tag = uuid.uuid4().hex[:8]
+        branch = Branch.objects.create(name=f"bench-{tag}")
+        products = [Product.objects.create(name=f"bench-{tag}-{i}", count_type="pcs") for i in range(n_products)]
+        BranchProduct.objects.bulk_create(
+            [BranchProduct(branch=branch, product=p, stock_qty=Decimal("1000000"), avg_unit_cost=100) for p in products]
+        )
+        food = Food.objects.create(branch=branch, name="Burger", type=FoodType.FASTFOOD, sell_price=30000)
+        FoodItem.objects.bulk_create([FoodItem(food=food, product=p, qty=Decimal("1")) for p in products])
+        return branch, food, [p.id for p in products]
+
+    def _run(self, mode, branch, food, product_ids, n_orders, n_threads):
+        orders = [
+            create_order_with_items(branch, [{"food": str(food.id), "qty": 1}]).pk
+            for _ in range(n_orders)
+        ]
+        before = dict(BranchProduct.objects.filter(branch=branch).values_list("product_id", "stock_qty"))
+
+        latencies, errors = [], []
+        lock = threading.Lock()
+        chunks = [orders[i::n_threads] for i in range(n_threads)]
+
+        def worker(ids):
+            try:
+                for oid in ids:
+                    t = time.perf_counter()
+                    try:
+                        mark_delivered(Order(pk=oid))
+                    except Exception as e:  # deadlock / serialization xatolari ham sanaladi
+                        with lock:
+                            errors.append(repr(e))
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - t)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        # kechiktirilgan rejimda mark_delivered faqat navbatga yozadi — o'lchash uchun sinxron yechamiz
+        with override_settings(STOCK_CONSUMPTION_MODE=mode, STOCK_APPLY_DEFERRED=False):
+            started = time.perf_counter()
+            threads = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            elapsed = time.perf_counter() - started
+
+        after = dict(BranchProduct.objects.filter(branch=branch).values_list("product_id", "stock_qty"))
+        done = len(latencies)
+        consistent = all(before[pid] - after[pid] == done for pid in product_ids)
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"{mode:12} orders={done}/{n_orders} threads={n_threads} "
+            f"time={elapsed:.2f}s rate={done / elapsed if elapsed else 0:.1f}/s "
+            f"p50={statistics.median(latencies) * 1000 if latencies else 0:.1f}ms p95={p95 * 1000:.1f}ms "
+            f"errors={len(errors)} stock_ok={consistent}"
+        )
+        for e in errors[:3]:
+            self.stdout.write(self.style.WARNING(f"  {e}"))
+
+    def _cleanup(self, branch, product_ids):
+        StockMove.objects.filter(branch=branch).delete()
+        OrderEvent.objects.filter(branch=branch).delete()
+        Order.objects.filter(branch=branch).delete()
+        Food.objects.filter(branch=branch).delete()
+        BranchProduct.objects.filter(branch=branch).delete()
+        branch.delete()
+        Product.objects.filter(id__in=product_ids).delete()
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sales.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Eskirgan Idempotency-Key yozuvlarini o'chiradi (default: 24 soatdan eski)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ta kalit o'chirildi."))
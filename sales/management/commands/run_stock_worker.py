@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from sales.services import STOCK_BATCH_SIZE, process_stock_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Kechiktirilgan stock navbatini (STOCK_APPLY_DEFERRED) yechadigan worker. "
+        "Navbat bo'shaguncha partiyalab ishlaydi, keyin --interval soniya kutadi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=3.0)
+        parser.add_argument("--batch-size", type=int, default=STOCK_BATCH_SIZE)
+        parser.add_argument("--once", action="store_true", help="Navbatni bir marta bo'shatib chiqadi")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        try:
+            while True:
+                close_old_connections()
+                applied, failed = process_stock_jobs(batch_size=batch_size)
+                if applied or failed:
+                    self.stdout.write(f"yechildi: {applied}, xato: {failed}")
+                if applied + failed >= batch_size:
+                    continue  # navbatda yana bor
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 21:43
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='order',
+            options={'ordering': ('-created_at',), 'verbose_name': 'Buyurtma', 'verbose_name_plural': 'Buyurtmalar'},
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='cogs_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='profit_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 21:43
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_order_cogs_amount_profit_amount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('scope', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=100)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('response_headers', models.JSONField(blank=True, default=dict)),
+                ('response_body', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Idempotency kalit',
+                'verbose_name_plural': 'Idempotency kalitlar',
+                'indexes': [models.Index(fields=['created_at'], name='sales_idemp_created_09849e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'scope', 'key'), name='uniq_idempotency_user_scope_key')],
+            },
+        ),
+    ]
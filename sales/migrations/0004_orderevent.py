@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 21:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('sales', '0003_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('order_id', models.UUIDField()),
+                ('kind', models.CharField(choices=[('created', 'Yaratildi'), ('paid', 'To‘landi'), ('delivered', 'Topshirildi')], max_length=12)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_events', to='core.branch')),
+            ],
+            options={
+                'verbose_name': 'Order hodisasi',
+                'verbose_name_plural': 'Order hodisalari',
+                'indexes': [models.Index(fields=['branch', 'id'], name='sales_order_branch__d509cb_idx'), models.Index(fields=['created_at'], name='sales_order_created_68813e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 21:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('sales', '0004_orderevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockApplyJob',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_jobs', to='core.branch')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_job', to='sales.order')),
+            ],
+            options={
+                'verbose_name': 'Stock navbati',
+                'verbose_name_plural': 'Stock navbati',
+                'indexes': [models.Index(fields=['attempts', 'id'], name='sales_stock_attempt_97fa7c_idx')],
+            },
+        ),
+    ]
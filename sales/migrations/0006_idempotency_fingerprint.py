@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_stockapplyjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='request_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='request_path',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
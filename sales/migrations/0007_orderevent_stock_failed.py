@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_idempotency_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderevent',
+            name='kind',
+            field=models.CharField(choices=[('created', 'Yaratildi'), ('paid', 'To‘landi'), ('delivered', 'Topshirildi'), ('stock_failed', 'Stock yechilmadi')], max_length=12),
+        ),
+    ]
@@ -160,3 +160,93 @@ class OrderPayment(models.Model):
 
     def __str__(self):
         return f"{self.order_id} +{self.amount}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Takroriy so'rovlardan himoya (double-tap "to'lash", brauzer resubmit).
+
+    Bir xil (user, scope, key) qayta kelsa — saqlangan javob qaytariladi,
+    order/kassa qatorlari qayta lock qilinmaydi. status_code=None — so'rov hali bajarilmoqda.
+    Kalit so'rovga bog'langan (path + body hash): boshqa so'rovda qayta ishlatilsa — 422.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=100)
+    request_path = models.CharField(max_length=255, blank=True, default="")
+    request_hash = models.CharField(max_length=64, blank=True, default="")  # sha256 hex
+
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_headers = models.JSONField(default=dict, blank=True)
+    response_body = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "scope", "key"], name="uniq_idempotency_user_scope_key"),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"]),
+        ]
+        verbose_name = "Idempotency kalit"
+        verbose_name_plural = "Idempotency kalitlar"
+
+    def __str__(self):
+        return f"{self.scope} | {self.key}"
+
+
+class OrderEvent(models.Model):
+    """
+    Filial order o'zgarishlari jurnali (oshxona/kassa ekranlari uchun, pos_events qisqa poll).
+    id o'suvchi — ekranlar "oxirgi ko'rgan id"dan keyingilarini oladi.
+    """
+    class Kind(models.TextChoices):
+        CREATED = "created", "Yaratildi"
+        PAID = "paid", "To‘landi"
+        DELIVERED = "delivered", "Topshirildi"
+        STOCK_FAILED = "stock_failed", "Stock yechilmadi"
+
+    id = models.BigAutoField(primary_key=True)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="order_events")
+    order_id = models.UUIDField()
+    kind = models.CharField(max_length=12, choices=Kind.choices)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["branch", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
+        verbose_name = "Order hodisasi"
+        verbose_name_plural = "Order hodisalari"
+
+    def __str__(self):
+        return f"{self.branch_id} | {str(self.order_id)[:8]} | {self.kind}"
+
+
+class StockApplyJob(models.Model):
+    """
+    Kechiktirilgan stock yechish navbati (settings.STOCK_APPLY_DEFERRED).
+    mark_delivered faqat shu yerga yozadi; `run_stock_worker` partiyalab yechadi.
+    attempts >= STOCK_JOB_MAX_ATTEMPTS — worker tashlab ketgan (OrderEvent "stock_failed",
+    POS'da ko'rinadi); admin'da attempts=0 qilinsa qayta uriniladi.
+    """
+    id = models.BigAutoField(primary_key=True)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="stock_jobs")
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="stock_job")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["attempts", "id"]),
+        ]
+        verbose_name = "Stock navbati"
+        verbose_name_plural = "Stock navbati"
+
+    def __str__(self):
+        return f"{str(self.order_id)[:8]} ({self.attempts})"
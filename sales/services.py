@@ -1,32 +1,84 @@
 from __future__ import annotations
 
+import uuid
+
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import F, Sum
 from django.utils import timezone
 
-from finance.models import Direction, TxnType
+from finance.models import Direction, MoneyAccount, TxnType
 from finance.services import record_cash_txn
-from inventory.models import BranchProduct
-from menu.models import FoodItem, FoodType, SetItem
-from sales.models import Order, OrderItem, OrderPayment
+from catalog.models import Product
+from inventory.models import BranchProduct, StockMove
+from inventory.signals import stock_changed
+from menu.models import Food, FoodType
+from menu.services import get_food_boms, get_menu_snapshot
+from sales.models import Order, OrderEvent, OrderItem, OrderPayment, StockApplyJob
+
+
+def _order_event(order: Order, kind: str, **extra) -> OrderEvent:
+    return OrderEvent(
+        branch_id=order.branch_id,
+        order_id=order.pk,
+        kind=kind,
+        data={
+            "status": order.status,
+            "is_delivered": order.is_delivered,
+            "total_amount": int(order.total_amount),
+            "paid_amount": int(order.paid_amount),
+            **extra,
+        },
+    )
+
+
+def emit_order_event(order: Order, kind: str) -> None:
+    """Order hodisasini yozadi (o'sha tranzaksiyada — rollback bo'lsa hodisa ham yo'q)."""
+    _order_event(order, kind).save()
 
 
 @transaction.atomic
-def recalc_order_totals(order: Order) -> None:
-    """Order total_amount va paid_amount ni qayta hisoblaydi (idempotent)."""
+def recalc_order_totals(order: Order) -> bool:
+    """
+    Order total_amount va paid_amount ni noldan qayta hisoblaydi (idempotent).
+
+    Oddiy yo'lda totals delta orqali yuradi (_apply_totals_delta). Bu funksiya —
+    tekshirish/tuzatish yo'li: admin inline editlari yoki `verify=True` uchun.
+    Qiymatlar o'zgargan bo'lsa True qaytaradi.
+    """
     o = Order.objects.select_for_update().get(pk=order.pk)
 
-    agg = o.items.aggregate(s=Sum("line_total"))
-    o.total_amount = int(agg["s"] or 0)
+    total = int(o.items.aggregate(s=Sum("line_total"))["s"] or 0)
+    paid = int(o.payments.aggregate(s=Sum("amount"))["s"] or 0)
 
-    paid = o.payments.aggregate(s=Sum("amount"))["s"] or 0
-    o.paid_amount = int(paid)
+    changed = (o.total_amount, o.paid_amount) != (total, paid)
+    if changed:
+        o.total_amount = total
+        o.paid_amount = paid
+        o.save(update_fields=["total_amount", "paid_amount"])
 
-    o.save(update_fields=["total_amount", "paid_amount"])
+    order.total_amount = total
+    order.paid_amount = paid
+    return changed
+
+
+def _apply_totals_delta(o: Order, *, total: int = 0, paid: int = 0) -> None:
+    """
+    Lock qilingan orderga totals deltasini F() bilan yozadi (aggregate'siz).
+    In-memory qiymat ham yangilanadi — row lock ostida bu aniq.
+    """
+    if not total and not paid:
+        return
+    Order.objects.filter(pk=o.pk).update(
+        total_amount=F("total_amount") + int(total),
+        paid_amount=F("paid_amount") + int(paid),
+    )
+    o.total_amount += int(total)
+    o.paid_amount += int(paid)
 
 
 @transaction.atomic
-def add_item(order: Order, *, food, qty: int) -> OrderItem:
+def add_item(order: Order, *, food, qty: int, verify: bool = False) -> OrderItem:
     """DRAFT orderga item qo'shadi (bir xil food bo'lsa qty oshiradi)."""
     o = Order.objects.select_for_update().get(pk=order.pk)
 
@@ -49,80 +101,342 @@ def add_item(order: Order, *, food, qty: int) -> OrderItem:
         food=food,
         defaults={"qty": qty, "unit_price": unit_price, "line_total": line_total},
     )
-    if not created:
+    if created:
+        delta = int(item.line_total)
+    else:
+        old_line_total = int(item.line_total)
         item.qty += int(qty)
         item.line_total = int(item.unit_price) * int(item.qty)
         item.save(update_fields=["qty", "line_total"])
+        delta = int(item.line_total) - old_line_total
 
-    recalc_order_totals(o)
+    if verify:
+        recalc_order_totals(o)
+    else:
+        _apply_totals_delta(o, total=delta)
     return item
 
 
-from decimal import Decimal
+def _normalize_cart(items) -> dict[uuid.UUID, int]:
+    """Chek qatorlarini {food_id: qty} ga yig'adi (bir xil food -> qty qo'shiladi)."""
+    cart: dict[uuid.UUID, int] = {}
+    for it in items:
+        raw_id = str(it.get("food") or "").strip()
+        qty = int(it.get("qty") or 0)
+        if not raw_id or qty <= 0:
+            continue
+        try:
+            food_id = uuid.UUID(raw_id)
+        except ValueError:
+            raise ValueError(f"Noto'g'ri food id: {raw_id}")
+        cart[food_id] = cart.get(food_id, 0) + qty
+    return cart
+
+
+def _queued_needs(branch_id, product_ids) -> dict:
+    """
+    Navbatdagi (StockApplyJob) — topshirilgan, lekin hali yechilmagan orderlar ehtiyoji.
+    Kechiktirilgan rejimda BranchProduct.stock_qty ularni hali ko'rsatmaydi.
+    """
+    rows = (
+        OrderItem.objects.filter(order__stock_job__branch_id=branch_id)
+        .values("food_id")
+        .annotate(total=Sum("qty"))
+    )
+    totals = {r["food_id"]: int(r["total"]) for r in rows}
+    if not totals:
+        return {}
+
+    needs: dict = {}
+    for food_id, bom in get_food_boms(totals.keys()).items():
+        for product_id, per_unit in bom.items():
+            if product_id in product_ids:
+                needs[product_id] = needs.get(product_id, Decimal("0")) + per_unit * totals[food_id]
+    return needs
+
+
+def check_cart_availability(branch, items) -> dict:
+    """
+    Savat uchun stock oldindan tekshiruvi (faqat o'qish, lock yo'q).
+
+    Food'lar menu snapshot'idan, retseptlar BOM keshidan olinadi; DB'ga query'lar —
+    kerakli BranchProduct qoldiqlari va navbatdagi (kechiktirilgan) yechishlar ehtiyoji,
+    ya'ni qoldiqdan hali yechilmagan topshirilgan orderlar ayiriladi. Qaytaradi:
+      {"ok": bool, "lines": [{food, name, qty, ok, max_qty, short: [...]}], "short": [...]}
+    short — savat bo'yicha jami ehtiyoj qoldiqdan oshgan mahsulotlar.
+    """
+    cart = _normalize_cart(items)
+    menu = {f["id"]: f for f in get_menu_snapshot(branch.pk)["foods"]}
+    boms = get_food_boms(cart.keys())
+
+    lines = []
+    needs: dict = {}
+    for food_id, qty in cart.items():
+        f = menu.get(str(food_id))
+        if f is None:
+            raise ValueError(f"Food topilmadi yoki aktiv emas: {food_id}")
+        bom = boms.get(food_id)
+        if bom is None:
+            raise ValueError(f"Set tarkibi bo'sh: {f['name']}. Avval SetItem qo'shing.")
+        lines.append((food_id, f, qty, bom))
+        for product_id, per_unit in bom.items():
+            needs[product_id] = needs.get(product_id, Decimal("0")) + per_unit * qty
+
+    stock = {
+        pid: (qty, name)
+        for pid, qty, name in BranchProduct.objects.filter(branch=branch, product_id__in=needs.keys())
+        .values_list("product_id", "stock_qty", "product__name")
+    }
+    for product_id, queued in _queued_needs(branch.pk, needs.keys()).items():
+        have, name = stock.get(product_id, (Decimal("0"), None))
+        stock[product_id] = (have - queued, name)
+
+    short = {}
+    for product_id, need in needs.items():
+        have = stock.get(product_id, (Decimal("0"), None))[0]
+        if have < need:
+            short[product_id] = {
+                "product": str(product_id),
+                "name": stock.get(product_id, (None, None))[1],
+                "need": str(need),
+                "stock": str(have),
+            }
+
+    out_lines = []
+    for food_id, f, qty, bom in lines:
+        max_qty = None
+        for product_id, per_unit in bom.items():
+            if per_unit > 0:
+                fit = int(stock.get(product_id, (Decimal("0"), None))[0] // per_unit)
+                max_qty = fit if max_qty is None else min(max_qty, fit)
+        line_short = [short[pid] for pid in bom if pid in short]
+        out_lines.append({
+            "food": str(food_id),
+            "name": f["name"],
+            "qty": qty,
+            "ok": not line_short,
+            "max_qty": max_qty,  # None — retseptsiz (stock talab qilmaydi)
+            "short": line_short,
+        })
+
+    return {"ok": not short, "lines": out_lines, "short": list(short.values())}
 
-def _consume_stock_for_order(order: Order) -> None:
-    if order.stock_applied:
-        return
 
-    total_cogs = Decimal("0.00")
+@transaction.atomic
+def create_order_with_items(
+    branch,
+    items,
+    *,
+    order_type: str = Order.OrderType.DINE_IN,
+    note: str | None = None,
+    created_by=None,
+    order_id=None,
+) -> Order:
+    """
+    Yangi order + itemlarni bitta paketda yaratadi.
+
+    items: [{"food": "<uuid>", "qty": 2}, ...]
+      - barcha Food'lar bitta `id__in` query bilan olinadi
+      - itemlar bitta `bulk_create` bilan yoziladi
+      - total_amount xotirada hisoblanadi (qayta aggregate shart emas)
+    order_id: klient yaratgan UUID (offline sync) — berilmasa avtomatik.
+    """
+    cart = _normalize_cart(items)
+    if not cart:
+        raise ValueError("Kamida bitta taom tanlang.")
+
+    foods = Food.objects.filter(id__in=cart.keys(), branch=branch, is_active=True).in_bulk()
+    missing = [str(fid) for fid in cart if fid not in foods]
+    if missing:
+        raise ValueError(f"Taom topilmadi yoki noaktiv: {', '.join(missing)}")
+
+    lines = []
+    total = 0
+    for food_id, qty in cart.items():
+        unit_price = int(foods[food_id].sell_price)
+        line_total = unit_price * qty
+        total += line_total
+        lines.append((foods[food_id], qty, unit_price, line_total))
+
+    order = Order(
+        branch=branch,
+        order_type=order_type,
+        note=note,
+        created_by=created_by,
+        total_amount=total,
+    )
+    if order_id is not None:
+        order.id = order_id
+    order.save(force_insert=True)
+
+    # Yangi (DRAFT, lock'siz) order: OrderItem.save() dagi full_clean/price tekshiruvlari
+    # shu yerda xotirada bajarilgan, shuning uchun bulk_create xavfsiz.
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=order, food=food, qty=qty, unit_price=unit_price, line_total=line_total)
+            for food, qty, unit_price, line_total in lines
+        ]
+    )
+    emit_order_event(order, OrderEvent.Kind.CREATED)
+    return order
 
-    def consume_food(food, qty_multiplier: int) -> Decimal:
-        cogs = Decimal("0.00")
-        recipe = FoodItem.objects.filter(food=food).select_related("product")
 
-        for ri in recipe:
-            need_qty = ri.qty * int(qty_multiplier)
+from decimal import Decimal
 
-            bp = (
-                BranchProduct.objects.select_for_update()
-                .filter(branch=order.branch, product=ri.product)
-                .first()
-            )
-            if bp is None:
-                raise ValueError(f"Stock topilmadi: {ri.product.name}. Avval import qiling.")
+def _order_product_needs(order: Order) -> dict:
+    """
+    Orderni bitta {product_id: need_qty} xaritasiga yoyadi.
+    Retseptlar menu BOM keshidan olinadi (SET'lar allaqachon yoyilgan).
+    """
+    return _needs_from_items(order.items.select_related("food").all())
 
-            if bp.stock_qty < need_qty:
-                raise ValueError(f"Stock yetarli emas: {ri.product.name} ({bp.stock_qty} < {need_qty})")
 
-            # ✅ COGS snapshot: shu paytdagi avg_unit_cost bilan
-            unit_cost = bp.avg_unit_cost or Decimal("0.00")
-            cogs += (unit_cost * need_qty)
+def _needs_from_items(order_items, boms: dict | None = None) -> dict:
+    lines = []
+    for oi in order_items:
+        f = oi.food
+        if f.type not in [FoodType.FASTFOOD, FoodType.DRINK, FoodType.SET]:
+            raise ValueError(f"Food type not supported for stock consume: {f.type}")
+        lines.append((f, int(oi.qty)))
 
-            bp.stock_qty = bp.stock_qty - need_qty
-            bp.save(update_fields=["stock_qty"])
+    if boms is None:
+        boms = get_food_boms([f.id for f, _ in lines])
 
-        return cogs
+    needs: dict = {}
+    for f, qty in lines:
+        bom = boms.get(f.id)
+        if bom is None:
+            raise ValueError(f"Set tarkibi bo'sh: {f.name}. Avval SetItem qo'shing.")
+        for product_id, per_unit in bom.items():
+            needs[product_id] = needs.get(product_id, Decimal("0")) + per_unit * qty
+    return needs
 
-    items = order.items.select_related("food").all()
 
-    for oi in items:
-        f = oi.food
+STOCK_MODE_LOCK = "lock"
+STOCK_MODE_CONDITIONAL = "conditional"
 
-        if f.type in [FoodType.FASTFOOD, FoodType.DRINK]:
-            total_cogs += consume_food(f, oi.qty)
-            continue
 
-        if f.type == FoodType.SET:
-            set_components = SetItem.objects.filter(set_food=f).select_related("food")
-            if not set_components.exists():
-                raise ValueError(f"Set tarkibi bo'sh: {f.name}. Avval SetItem qo'shing.")
+def _stock_shortfall_error(branch_id, product_id, need_qty) -> ValueError:
+    bp = (
+        BranchProduct.objects.filter(branch_id=branch_id, product_id=product_id)
+        .select_related("product").first()
+    )
+    if bp is None:
+        name = Product.objects.filter(id=product_id).values_list("name", flat=True).first()
+        return ValueError(f"Stock topilmadi: {name}. Avval import qiling.")
+    return ValueError(f"Stock yetarli emas: {bp.product.name} ({bp.stock_qty} < {need_qty})")
+
+
+def _consume_locked(branch_id, needs: dict) -> dict:
+    """
+    BranchProduct'lar bitta query bilan, product_id tartibida lock qilinadi
+    (deadlock bo'lmasin), keyin bitta bulk_update bilan yoziladi.
+    {product_id: avg_unit_cost} qaytaradi.
+    """
+    bps = list(
+        BranchProduct.objects.select_for_update()
+        .filter(branch_id=branch_id, product_id__in=needs.keys())
+        .order_by("product_id")
+    )
+    by_product = {bp.product_id: bp for bp in bps}
+
+    missing = [pid for pid in needs if pid not in by_product]
+    if missing:
+        name = Product.objects.filter(id__in=missing).order_by("name").values_list("name", flat=True).first()
+        raise ValueError(f"Stock topilmadi: {name}. Avval import qiling.")
+
+    for bp in bps:
+        need_qty = needs[bp.product_id]
+        if bp.stock_qty < need_qty:
+            raise ValueError(f"Stock yetarli emas: {bp.product.name} ({bp.stock_qty} < {need_qty})")
+        bp.stock_qty = bp.stock_qty - need_qty
+
+    BranchProduct.objects.bulk_update(bps, ["stock_qty"])
+    return {bp.product_id: bp.avg_unit_cost for bp in bps}
+
+
+def _consume_conditional(branch_id, needs: dict) -> dict:
+    """
+    O'qishsiz yechish: har bir mahsulot uchun bitta
+    UPDATE ... SET stock_qty = stock_qty - x WHERE stock_qty >= x (product_id tartibida).
+    0 qator yangilansa — yetishmovchilik, tranzaksiya bekor bo'ladi.
+    select_for_update yo'q; COGS narxi yechilgandan keyin bitta query bilan o'qiladi.
+    """
+    for product_id in sorted(needs, key=str):
+        need_qty = needs[product_id]
+        updated = BranchProduct.objects.filter(
+            branch_id=branch_id, product_id=product_id, stock_qty__gte=need_qty
+        ).update(stock_qty=F("stock_qty") - need_qty)
+        if not updated:
+            raise _stock_shortfall_error(branch_id, product_id, need_qty)
+
+    return dict(
+        BranchProduct.objects.filter(branch_id=branch_id, product_id__in=needs.keys())
+        .values_list("product_id", "avg_unit_cost")
+    )
 
-            for si in set_components:
-                total_qty = int(oi.qty) * int(si.qty)
-                total_cogs += consume_food(si.food, total_qty)
-            continue
 
-        raise ValueError(f"Food type not supported for stock consume: {f.type}")
+def _consume_needs(branch_id, needs: dict, *, mode: str | None = None) -> dict:
+    """Rejim: settings.STOCK_CONSUMPTION_MODE ("lock" / "conditional")."""
+    mode = mode or getattr(settings, "STOCK_CONSUMPTION_MODE", STOCK_MODE_LOCK)
+    if mode == STOCK_MODE_CONDITIONAL:
+        unit_costs = _consume_conditional(branch_id, needs)
+    else:
+        unit_costs = _consume_locked(branch_id, needs)
+    if needs:
+        stock_changed.send(sender=BranchProduct, branch_id=branch_id, product_ids=list(needs))
+    return unit_costs
+
+
+def _apply_cogs(order: Order, needs: dict, unit_costs: dict) -> list[StockMove]:
+    """COGS/profit ni orderga yozadi (saqlamaydi) va SALE harakatlarini qaytaradi."""
+    # ✅ COGS snapshot: shu paytdagi avg_unit_cost bilan
+    total_cogs = Decimal("0.00")
+    for product_id, need_qty in needs.items():
+        total_cogs += (unit_costs[product_id] or Decimal("0.00")) * need_qty
 
-    # ✅ Orderga snapshot yozamiz
     order.cogs_amount = total_cogs
     order.profit_amount = (order.total_amount or Decimal("0.00")) - total_cogs
     order.stock_applied = True
+    return [
+        StockMove(
+            branch_id=order.branch_id, product_id=product_id, kind=StockMove.Kind.SALE,
+            qty=-need_qty, unit_cost=unit_costs[product_id], ref_type="order", ref_id=order.id,
+        )
+        for product_id, need_qty in needs.items()
+    ]
+
+
+def _consume_stock_for_order(order: Order, *, mode: str | None = None) -> None:
+    """Order ingredientlarini stockdan yechadi va COGS snapshot yozadi."""
+    if order.stock_applied:
+        return
+
+    needs = _order_product_needs(order)
+    unit_costs = _consume_needs(order.branch_id, needs, mode=mode)
+    StockMove.objects.bulk_create(_apply_cogs(order, needs, unit_costs))
+
+    # ✅ Orderga snapshot yozamiz
     order.save(update_fields=["cogs_amount", "profit_amount", "stock_applied"])
 
+
+def stock_apply_deferred() -> bool:
+    return bool(getattr(settings, "STOCK_APPLY_DEFERRED", False))
+
+
+def enqueue_stock_apply(order: Order) -> None:
+    """Orderni kechiktirilgan stock navbatiga qo'yadi (takror qo'yilsa e'tiborsiz)."""
+    StockApplyJob.objects.bulk_create(
+        [StockApplyJob(branch_id=order.branch_id, order_id=order.pk)], ignore_conflicts=True
+    )
+
+
 @transaction.atomic
-def apply_stock_for_order_if_needed(order: Order) -> None:
-    """Order topshirilgan bo'lsa va stock hali yechilmagan bo'lsa, ingredientlarni yechadi."""
+def apply_stock_for_order_if_needed(order: Order, *, defer: bool | None = None) -> None:
+    """
+    Order topshirilgan bo'lsa va stock hali yechilmagan bo'lsa, ingredientlarni yechadi.
+    Kechiktirilgan rejimda (STOCK_APPLY_DEFERRED) faqat navbatga qo'yadi.
+    """
     o = Order.objects.select_for_update().get(pk=order.pk)
 
     if o.stock_applied:
@@ -131,11 +445,107 @@ def apply_stock_for_order_if_needed(order: Order) -> None:
     if not o.is_delivered:
         raise ValueError("Stock faqat TOPSHIRILGAN (mijozga berilgan) order uchun yechiladi")
 
+    if defer is None:
+        defer = stock_apply_deferred()
+    if defer:
+        enqueue_stock_apply(o)
+        return
+
     _consume_stock_for_order(o)
     o.stock_applied = True
     o.save(update_fields=["stock_applied"])
 
 
+STOCK_BATCH_SIZE = 200
+STOCK_JOB_MAX_ATTEMPTS = 5
+
+
+def process_stock_jobs(*, batch_size: int = STOCK_BATCH_SIZE) -> tuple[int, int]:
+    """
+    Navbatdan bitta partiyani yechadi (worker chaqiradi). Bitta tranzaksiya:
+      - navbat qatorlari skip_locked bilan olinadi (bir nechta worker xavfsiz)
+      - filial bo'yicha barcha orderlar ehtiyoji qo'shiladi va BranchProduct'lar
+        bir marta lock qilinadi / yechiladi
+      - yetishmovchilik bo'lsa — shu filial orderlari alohida (savepoint) yechiladi,
+        muvaffaqiyatsizlari navbatda qoladi (attempts, last_error)
+      - STOCK_JOB_MAX_ATTEMPTS'ga yetgan order uchun "stock_failed" hodisasi yoziladi
+        (POS ekranlari ko'radi) — navbat qatori admin'da qayta ishga tushirish uchun qoladi
+    (yechilgan orderlar, xato bo'lganlar) sonini qaytaradi.
+    """
+    with transaction.atomic():
+        jobs = list(
+            StockApplyJob.objects.select_for_update(skip_locked=True)
+            .filter(attempts__lt=STOCK_JOB_MAX_ATTEMPTS)
+            .order_by("id")[:batch_size]
+        )
+        if not jobs:
+            return 0, 0
+
+        orders = {
+            o.pk: o
+            for o in Order.objects.select_for_update().filter(pk__in=[j.order_id for j in jobs]).order_by("pk")
+        }
+        done_jobs = [j for j in jobs if j.order_id not in orders or orders[j.order_id].stock_applied]
+        jobs = [j for j in jobs if j not in done_jobs]
+
+        items: dict = {}
+        for oi in OrderItem.objects.filter(order_id__in=[j.order_id for j in jobs]).select_related("food"):
+            items.setdefault(oi.order_id, []).append(oi)
+        boms = get_food_boms({oi.food_id for lines in items.values() for oi in lines})
+
+        errors: dict = {}
+        needs: dict = {}
+        by_branch: dict = {}
+        for j in jobs:
+            try:
+                needs[j.order_id] = _needs_from_items(items.get(j.order_id, []), boms)
+            except ValueError as e:
+                errors[j.pk] = str(e)
+                continue
+            by_branch.setdefault(j.branch_id, []).append(j)
+
+        applied: list[Order] = []
+        moves: list[StockMove] = []
+        for branch_id, branch_jobs in by_branch.items():
+            merged: dict = {}
+            for j in branch_jobs:
+                for product_id, qty in needs[j.order_id].items():
+                    merged[product_id] = merged.get(product_id, Decimal("0")) + qty
+            try:
+                with transaction.atomic():
+                    unit_costs = _consume_needs(branch_id, merged)
+                ok = [(j, unit_costs) for j in branch_jobs]
+            except ValueError:
+                ok = []
+                for j in branch_jobs:
+                    try:
+                        with transaction.atomic():
+                            ok.append((j, _consume_needs(branch_id, needs[j.order_id])))
+                    except ValueError as e:
+                        errors[j.pk] = str(e)
+
+            for j, unit_costs in ok:
+                order = orders[j.order_id]
+                moves += _apply_cogs(order, needs[j.order_id], unit_costs)
+                applied.append(order)
+                done_jobs.append(j)
+
+        Order.objects.bulk_update(applied, ["cogs_amount", "profit_amount", "stock_applied"])
+        StockMove.objects.bulk_create(moves)
+        StockApplyJob.objects.filter(pk__in=[j.pk for j in done_jobs]).delete()
+
+        failed = [j for j in jobs if j.pk in errors]
+        gave_up = []
+        for j in failed:
+            j.attempts += 1
+            j.last_error = errors[j.pk][:255]
+            if j.attempts >= STOCK_JOB_MAX_ATTEMPTS:
+                gave_up.append(_order_event(orders[j.order_id], OrderEvent.Kind.STOCK_FAILED, error=j.last_error))
+        StockApplyJob.objects.bulk_update(failed, ["attempts", "last_error"])
+        OrderEvent.objects.bulk_create(gave_up)
+        return len(applied), len(failed)
+
+
 @transaction.atomic
 def mark_delivered(order: Order, *, by_user=None) -> Order:
     """Orderni 'topshirildi' deb belgilaydi va stockni (1 marta) yechadi."""
@@ -153,6 +563,7 @@ def mark_delivered(order: Order, *, by_user=None) -> Order:
     o.save(update_fields=["is_delivered", "delivered_at", "delivered_by"])
 
     apply_stock_for_order_if_needed(o)
+    emit_order_event(o, OrderEvent.Kind.DELIVERED)
 
     # Agar order allaqachon to'liq to'langan bo'lsa -> yakunlaymiz
     if o.status == Order.Status.PAID and not o.is_locked:
@@ -165,8 +576,20 @@ def mark_delivered(order: Order, *, by_user=None) -> Order:
 
 
 @transaction.atomic
-def pay_order(order: Order, *, account, amount: int, note: str | None = None, by_user) -> OrderPayment:
-    """Orderga to'lov yozadi va kassaga (cash_txn) tushum yozadi."""
+def pay_order(
+    order: Order,
+    *,
+    account,
+    amount: int,
+    note: str | None = None,
+    by_user,
+    verify: bool = False,
+) -> OrderPayment:
+    """
+    Orderga to'lov yozadi va kassaga (cash_txn) tushum yozadi.
+
+    Totals delta bilan yangilanadi; verify=True bo'lsa avval to'liq qayta hisoblanadi.
+    """
     o = Order.objects.select_for_update().get(pk=order.pk)
 
     if o.is_locked:
@@ -187,7 +610,8 @@ def pay_order(order: Order, *, account, amount: int, note: str | None = None, by
     if o.status == Order.Status.PAID:
         raise ValueError("Order already PAID")
 
-    recalc_order_totals(o)
+    if verify:
+        recalc_order_totals(o)
     due = o.total_amount - o.paid_amount
     if amount <= 0:
         raise ValueError("amount must be > 0")
@@ -210,8 +634,8 @@ def pay_order(order: Order, *, account, amount: int, note: str | None = None, by
     p.cash_txn = tx
     p.save(update_fields=["cash_txn"])
 
-    # totals update
-    recalc_order_totals(o)
+    # totals update (delta)
+    _apply_totals_delta(o, paid=amount)
 
     # agar to‘liq yopildi -> PAID
     if o.total_amount > 0 and o.paid_amount >= o.total_amount:
@@ -219,6 +643,7 @@ def pay_order(order: Order, *, account, amount: int, note: str | None = None, by
         o.paid_at = timezone.now()
         o.paid_by = by_user
         o.save(update_fields=["status", "paid_at", "paid_by"])
+        emit_order_event(o, OrderEvent.Kind.PAID)
 
         # Agar topshirilgan bo'lsa -> yakunlaymiz
         if o.is_delivered and not o.is_locked:
@@ -228,3 +653,56 @@ def pay_order(order: Order, *, account, amount: int, note: str | None = None, by
             o.save(update_fields=["is_locked", "locked_at", "locked_by"])
 
     return p
+
+
+@transaction.atomic
+def apply_offline_order(branch, data: dict, *, by_user) -> tuple[Order, bool]:
+    """
+    Offline (tarmoqsiz) yaratilgan bitta orderni qo'llaydi — idempotent.
+
+    data: {"id": "<uuid>", "items": [...], "order_type", "note",
+           "is_delivered": bool, "payment": {"account_id", "amount"} | null}
+    Order id klientdan keladi: shu id bilan order bor bo'lsa qayta yaratilmaydi.
+    (order, created) qaytaradi.
+    """
+    try:
+        order_id = uuid.UUID(str(data.get("id") or ""))
+    except ValueError:
+        raise ValueError("Order id (UUID) noto'g'ri")
+
+    existing = Order.objects.filter(pk=order_id).first()
+    if existing is not None:
+        if existing.branch_id != branch.id:
+            raise ValueError("Bu id boshqa filial orderiga tegishli")
+        return existing, False
+
+    order_type = data.get("order_type") or Order.OrderType.DINE_IN
+    if order_type not in Order.OrderType.values:
+        order_type = Order.OrderType.DINE_IN
+
+    order = create_order_with_items(
+        branch,
+        data.get("items") or [],
+        order_type=order_type,
+        note=(str(data.get("note") or "").strip() or None),
+        created_by=by_user,
+        order_id=order_id,
+    )
+
+    if data.get("is_delivered"):
+        mark_delivered(order, by_user=by_user)
+
+    payment = data.get("payment")
+    if payment:
+        accounts = MoneyAccount.objects.filter(branch=branch, is_active=True)
+        account_id = payment.get("account_id")
+        acc = accounts.filter(id=account_id).first() if account_id else accounts.order_by("name").first()
+        if acc is None:
+            raise ValueError("Kassa topilmadi")
+
+        amount = int(payment.get("amount") or order.total_amount)
+        if amount > 0:
+            pay_order(order, account=acc, amount=amount, by_user=by_user)
+
+    order.refresh_from_db()
+    return order, True
@@ -1,3 +1,43 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from catalog.models import Product
+from core.models import Branch
+from menu.models import Food, FoodItem, FoodType
+
+from .models import Order
+from .services import create_order_with_items
+
+
+class CreateOrderWithItemsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name="Test filial")
+        product = Product.objects.create(name="Non", count_type="pcs")
+        cls.foods = []
+        for i in range(5):
+            food = Food.objects.create(
+                branch=cls.branch, name=f"Taom {i}", type=FoodType.FASTFOOD, sell_price=1000 * (i + 1),
+            )
+            FoodItem.objects.create(food=food, product=product, qty=Decimal("1"))
+            cls.foods.append(food)
+
+    def test_query_budget_does_not_grow_with_lines(self):
+        items = [{"food": str(f.id), "qty": 2} for f in self.foods]
+        # savepoint + Food'lar (1) + Order INSERT (1) + OrderItem bulk INSERT (1)
+        # + OrderEvent INSERT (1) + savepoint release — qatorlar soniga bog'liq emas
+        with self.assertNumQueries(6):
+            order = create_order_with_items(self.branch, items)
+
+        order.refresh_from_db()
+        self.assertEqual(order.items.count(), 5)
+        self.assertEqual(order.total_amount, sum(2 * int(f.sell_price) for f in self.foods))
+        self.assertEqual(order.status, Order.Status.DRAFT)
+
+    def test_duplicate_lines_are_merged(self):
+        food = self.foods[0]
+        order = create_order_with_items(
+            self.branch, [{"food": str(food.id), "qty": 1}, {"food": str(food.id), "qty": 2}],
+        )
+        self.assertEqual(list(order.items.values_list("qty", flat=True)), [3])
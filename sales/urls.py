@@ -11,4 +11,14 @@ urlpatterns = [
     path("order/<uuid:pk>/pay/", views.pos_order_pay, name="pos_order_pay"),
     path("order/<uuid:pk>/deliver/", views.pos_order_deliver, name="pos_order_deliver"),
     path("api/menu/", views.pos_menu_json, name="pos_menu_json"),
+    path("api/menu/sellable/", views.pos_menu_sellable_json, name="pos_menu_sellable_json"),
+    path("api/orders/", views.pos_orders_json, name="pos_orders_json"),
+    path("api/sync/", views.pos_sync, name="pos_sync"),
+    path("api/events/", views.pos_events, name="pos_events"),
+    path("api/order/", views.api_order, name="api_order"),
+    path("api/cart/check/", views.api_cart_check, name="api_cart_check"),
+    path("api/order/<uuid:pk>/", views.api_order_detail, name="api_order_detail"),
+    path("api/order/<uuid:pk>/items/", views.api_order_add_item, name="api_order_add_item"),
+    path("api/order/<uuid:pk>/pay/", views.api_order_pay, name="api_order_pay"),
+    path("api/order/<uuid:pk>/deliver/", views.api_order_deliver, name="api_order_deliver"),
 ]
@@ -1,22 +1,36 @@
 from __future__ import annotations
 
 import json
-from typing import Any
-
+import uuid
+from datetime import timedelta
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
-from django.http import HttpResponseForbidden, JsonResponse
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_http_methods, require_POST
+from django.utils import timezone
+from django.views.decorators.http import condition, require_http_methods, require_POST
 
 from core.middleware import get_active_branch
+from core.pagination import keyset_page, page_size
 from finance.models import AccountKind, MoneyAccount
 from menu.models import Food, FoodType
+from menu.services import get_menu_snapshot, get_sellable, menu_etag, sellable_etag, sellable_payload_json
 from users.models import StaffRole
 
-from .models import Order, OrderItem
-from .services import mark_delivered, pay_order, recalc_order_totals
+from .idempotency import idempotent
+from .models import Order, OrderEvent, StockApplyJob
+from .services import (
+    STOCK_JOB_MAX_ATTEMPTS,
+    add_item,
+    apply_offline_order,
+    check_cart_availability,
+    create_order_with_items,
+    mark_delivered,
+    pay_order,
+)
 
 
 def _is_admin_like(user) -> bool:
@@ -52,23 +66,36 @@ def _branch_accounts(branch):
     return qs
 
 
-@login_required
-def pos_orders(request):
-    """Operator uchun: filial orderlari ro'yxati."""
-    try:
-        branch = _require_branch(request)
-    except LookupError:
-        return redirect("select_branch")
-    except PermissionError:
-        return HttpResponseForbidden("Sizga filial biriktirilmagan yoki faol filial tanlanmagan.")
+# Ro'yxat uchun kerakli ustunlar (user FK'lar join qilinmaydi)
+ORDER_LIST_FIELDS = (
+    "id",
+    "branch_id",
+    "order_type",
+    "status",
+    "is_delivered",
+    "total_amount",
+    "paid_amount",
+    "created_at",
+)
 
+
+def _gave_up_jobs():
+    """Worker tashlab ketgan stock navbati qatorlari (STOCK_JOB_MAX_ATTEMPTS)."""
+    return StockApplyJob.objects.filter(attempts__gte=STOCK_JOB_MAX_ATTEMPTS)
+
+
+def _orders_page(request, branch):
+    """
+    Filial orderlari — keyset pagination (created_at, id) bo'yicha.
+    (branch, status, created_at) / (branch, is_delivered, created_at) indekslari ishlatiladi.
+    """
     status = (request.GET.get("status") or "").strip()
     delivered = (request.GET.get("delivered") or "").strip()  # '1' / '0'
 
     qs = (
         Order.objects.filter(branch=branch)
-        .select_related("created_by", "paid_by", "delivered_by")
-        .order_by("-created_at")
+        .only(*ORDER_LIST_FIELDS)
+        .annotate(stock_failed=Exists(_gave_up_jobs().filter(order=OuterRef("pk"))))
     )
 
     if status in {Order.Status.DRAFT, Order.Status.PAID, Order.Status.CANCELED}:
@@ -77,7 +104,28 @@ def pos_orders(request):
     if delivered in {"0", "1"}:
         qs = qs.filter(is_delivered=(delivered == "1"))
 
-    orders = list(qs[:200])
+    orders, next_cursor = keyset_page(
+        qs,
+        cursor=(request.GET.get("cursor") or "").strip() or None,
+        limit=page_size(request.GET.get("limit")),
+    )
+    return orders, next_cursor, status, delivered
+
+
+@login_required
+def pos_orders(request):
+    """Operator uchun: filial orderlari ro'yxati."""
+    try:
+        branch = _require_branch(request)
+    except LookupError:
+        return redirect("select_branch")
+    except PermissionError:
+        return HttpResponseForbidden("Sizga filial biriktirilmagan yoki faol filial tanlanmagan.")
+
+    try:
+        orders, next_cursor, status, delivered = _orders_page(request, branch)
+    except ValueError:
+        return redirect("sales:pos_orders")
 
     return render(
         request,
@@ -85,6 +133,7 @@ def pos_orders(request):
         {
             "branch": branch,
             "orders": orders,
+            "next_cursor": next_cursor,
             "status": status,
             "delivered": delivered,
             "Status": Order.Status,
@@ -92,8 +141,44 @@ def pos_orders(request):
     )
 
 
+@login_required
+def pos_orders_json(request):
+    """Orderlar ro'yxati (infinite scroll): ?cursor=...&limit=...&status=&delivered="""
+    try:
+        branch = _require_branch(request)
+    except LookupError:
+        return JsonResponse({"error": "branch_not_selected"}, status=400)
+    except PermissionError:
+        return JsonResponse({"error": "no_branch"}, status=403)
+
+    try:
+        orders, next_cursor, _, _ = _orders_page(request, branch)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(
+        {
+            "orders": [
+                {
+                    "id": str(o.id),
+                    "order_type": o.order_type,
+                    "status": o.status,
+                    "is_delivered": o.is_delivered,
+                    "stock_failed": o.stock_failed,
+                    "total_amount": int(o.total_amount),
+                    "paid_amount": int(o.paid_amount),
+                    "created_at": o.created_at.isoformat(),
+                }
+                for o in orders
+            ],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
+@idempotent("order_create")
 def pos_order_create(request):
     """Yangi order yaratish (menu + chek)."""
     try:
@@ -103,31 +188,7 @@ def pos_order_create(request):
     except PermissionError:
         return HttpResponseForbidden("Sizga filial biriktirilmagan yoki faol filial tanlanmagan.")
 
-    foods_qs = (
-        Food.objects.filter(is_active=True, branch=branch)
-        .select_related("category")
-        .order_by("type", "category__sort_order", "sort_order", "name")
-    )
-
-    # JS uchun minimal JSON
-    foods_json: list[dict[str, Any]] = []
-    for f in foods_qs:
-        img = None
-        try:
-            if f.image:
-                img = f.image.url
-        except Exception:
-            img = None
-
-        foods_json.append(
-            {
-                "id": str(f.id),
-                "name": f.name,
-                "type": f.type,
-                "sell_price": int(f.sell_price),
-                "image": img,
-            }
-        )
+    menu = get_menu_snapshot(branch.id)
 
     accounts = list(_branch_accounts(branch))
 
@@ -159,34 +220,14 @@ def pos_order_create(request):
 
         try:
             with transaction.atomic():
-                order = Order.objects.create(
-                    branch=branch,
+                order = create_order_with_items(
+                    branch,
+                    items,
                     order_type=order_type,
                     note=note,
                     created_by=request.user,
                 )
 
-                # items
-                for it in items:
-                    food_id = (it.get("food") or "").strip()
-                    qty = int(it.get("qty") or 0)
-
-                    if not food_id or qty <= 0:
-                        continue
-
-                    food = get_object_or_404(Food, id=food_id, branch=branch, is_active=True)
-
-                    OrderItem.objects.create(
-                        order=order,
-                        food=food,
-                        qty=qty,
-                        unit_price=int(food.sell_price),
-                        line_total=0,  # save() qayta hisoblaydi
-                    )
-
-                recalc_order_totals(order)
-                order.refresh_from_db()
-
                 # topshirildi -> stock yechish
                 if is_delivered:
                     mark_delivered(order, by_user=request.user)
@@ -216,16 +257,18 @@ def pos_order_create(request):
             messages.error(request, f"Order yaratilmadi: {e}")
             return redirect("sales:pos_order_create")
 
+    sellable = get_sellable(branch.id, [f["id"] for f in menu["foods"]])
     return render(
         request,
         "sales/pos_order_create.html",
         {
             "branch": branch,
-            "foods": list(foods_qs),
-            "foods_json": json.dumps(foods_json, ensure_ascii=False),
+            "foods": [{**f, "sellable": sellable.get(uuid.UUID(f["id"]))} for f in menu["foods"]],
+            "foods_json": menu["foods_json"],
             "FoodType": FoodType,
             "accounts": accounts,
             "OrderType": Order.OrderType,
+            "idempotency_key": uuid.uuid4(),
         },
     )
 
@@ -250,6 +293,7 @@ def pos_order_detail(request, pk):
     accounts = list(_branch_accounts(branch))
 
     due = max(0, int(order.total_amount) - int(order.paid_amount))
+    stock_job = None if order.stock_applied else StockApplyJob.objects.filter(order=order).first()
 
     return render(
         request,
@@ -261,14 +305,18 @@ def pos_order_detail(request, pk):
             "payments": payments,
             "accounts": accounts,
             "due": due,
+            "stock_job": stock_job,
+            "stock_failed": stock_job is not None and stock_job.attempts >= STOCK_JOB_MAX_ATTEMPTS,
             "Status": Order.Status,
             "OrderType": Order.OrderType,
+            "idempotency_key": uuid.uuid4(),
         },
     )
 
 
 @login_required
 @require_POST
+@idempotent("order_pay")
 def pos_order_pay(request, pk):
     try:
         branch = _require_branch(request)
@@ -332,9 +380,19 @@ def pos_order_deliver(request, pk):
     return redirect("sales:pos_order_detail", pk=pk)
 
 
+def _menu_etag(request):
+    branch = get_active_branch(request)
+    return menu_etag(branch.id) if branch else None
+
+
 @login_required
+@condition(etag_func=_menu_etag)
 def pos_menu_json(request):
-    """(Ixtiyoriy) Menu JSON — front uchun."""
+    """
+    Menu JSON — front uchun (oldindan serialize qilingan filial snapshot'i).
+    ETag = filial menu versiyasi: o'zgarmagan bo'lsa 304, DB'ga bormaydi.
+    Qoldiq (sellable) alohida endpointda — sotuvlar bu ETag'ni eskirtirmaydi.
+    """
     try:
         branch = _require_branch(request)
     except LookupError:
@@ -342,19 +400,337 @@ def pos_menu_json(request):
     except PermissionError:
         return JsonResponse({"error": "no_branch"}, status=403)
 
-    foods_qs = Food.objects.filter(is_active=True, branch=branch).order_by("type", "sort_order", "name")
+    return HttpResponse(get_menu_snapshot(branch.id)["payload_json"], content_type="application/json")
+
+
+def _sellable_etag(request):
+    branch = get_active_branch(request)
+    return sellable_etag(branch.id) if branch else None
 
-    out = []
-    for f in foods_qs:
-        out.append(
+
+@login_required
+@condition(etag_func=_sellable_etag)
+def pos_menu_sellable_json(request):
+    """
+    Har bir Food uchun sotsa bo'ladigan miqdor: {"sellable": {food_id: int | null}}.
+    ETag = filial sellable versiyasi (stock o'zgarganda oshadi).
+    """
+    try:
+        branch = _require_branch(request)
+    except LookupError:
+        return JsonResponse({"error": "branch_not_selected"}, status=400)
+    except PermissionError:
+        return JsonResponse({"error": "no_branch"}, status=403)
+
+    return HttpResponse(sellable_payload_json(branch.id), content_type="application/json")
+
+
+# =====================
+# JSON ORDER API
+# =====================
+def _json_body(request) -> dict:
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        raise ValueError("JSON noto'g'ri")
+    if not isinstance(data, dict):
+        raise ValueError("JSON obyekt kutilgan")
+    return data
+
+
+def _order_state(order_id) -> dict:
+    """Orderning joriy holati (front joyida yangilashi uchun)."""
+    order = Order.objects.get(pk=order_id)
+    items = order.items.select_related("food").order_by("food__name")
+    payments = order.payments.select_related("account").order_by("-created_at")
+    return {
+        "id": str(order.id),
+        "status": order.status,
+        "order_type": order.order_type,
+        "is_delivered": order.is_delivered,
+        "is_locked": order.is_locked,
+        "total_amount": int(order.total_amount),
+        "paid_amount": int(order.paid_amount),
+        "due": max(0, int(order.total_amount) - int(order.paid_amount)),
+        "items": [
             {
-                "id": str(f.id),
-                "name": f.name,
-                "type": f.type,
-                "sell_price": int(f.sell_price),
+                "id": str(it.id),
+                "food": str(it.food_id),
+                "name": it.food.name,
+                "qty": int(it.qty),
+                "unit_price": int(it.unit_price),
+                "line_total": int(it.line_total),
             }
+            for it in items
+        ],
+        "payments": [
+            {
+                "id": str(p.id),
+                "account": str(p.account_id),
+                "account_name": p.account.name,
+                "amount": int(p.amount),
+                "created_at": p.created_at.isoformat(),
+            }
+            for p in payments
+        ],
+    }
+
+
+def _error_text(e: Exception) -> str:
+    return " ".join(e.messages) if isinstance(e, DjangoValidationError) else str(e)
+
+
+def _api_branch(request):
+    try:
+        return _require_branch(request), None
+    except LookupError:
+        return None, JsonResponse({"error": "branch_not_selected"}, status=400)
+    except PermissionError:
+        return None, JsonResponse({"error": "no_branch"}, status=403)
+
+
+@login_required
+@require_POST
+@idempotent("api_order_create")
+def api_order(request):
+    """Yangi order: {"items": [{"food", "qty"}], "order_type", "note"}."""
+    branch, err = _api_branch(request)
+    if err:
+        return err
+
+    try:
+        data = _json_body(request)
+        order_type = data.get("order_type") or Order.OrderType.DINE_IN
+        if order_type not in Order.OrderType.values:
+            order_type = Order.OrderType.DINE_IN
+        order = create_order_with_items(
+            branch,
+            data.get("items") or [],
+            order_type=order_type,
+            note=(str(data.get("note") or "").strip() or None),
+            created_by=request.user,
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(_order_state(order.pk), status=201)
+
+
+@login_required
+@require_POST
+def api_cart_check(request):
+    """Savat stock tekshiruvi (faqat o'qish): {"items": [{"food", "qty"}]}."""
+    branch, err = _api_branch(request)
+    if err:
+        return err
+    try:
+        data = _json_body(request)
+        result = check_cart_availability(branch, data.get("items") or [])
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(result)
+
+
+@login_required
+def api_order_detail(request, pk):
+    branch, err = _api_branch(request)
+    if err:
+        return err
+    order = get_object_or_404(Order.objects.only("id"), pk=pk, branch=branch)
+    return JsonResponse(_order_state(order.pk))
+
+
+@login_required
+@require_POST
+def api_order_add_item(request, pk):
+    """{"food": "<uuid>", "qty": 1}"""
+    branch, err = _api_branch(request)
+    if err:
+        return err
+    order = get_object_or_404(Order, pk=pk, branch=branch)
+
+    try:
+        data = _json_body(request)
+        qty = int(data.get("qty") or 0)
+        if qty <= 0:
+            raise ValueError("qty must be > 0")
+        food = Food.objects.filter(id=data.get("food"), branch=branch, is_active=True).first()
+        if food is None:
+            raise ValueError("Taom topilmadi yoki noaktiv")
+        add_item(order, food=food, qty=qty)
+    except (ValueError, DjangoValidationError) as e:
+        return JsonResponse({"error": _error_text(e)}, status=400)
+
+    return JsonResponse(_order_state(order.pk))
+
+
+@login_required
+@require_POST
+@idempotent("api_order_pay")
+def api_order_pay(request, pk):
+    """{"account_id": "<uuid>", "amount": 10000, "note": "..."}"""
+    branch, err = _api_branch(request)
+    if err:
+        return err
+    order = get_object_or_404(Order, pk=pk, branch=branch)
+
+    try:
+        data = _json_body(request)
+        acc = MoneyAccount.objects.filter(id=data.get("account_id"), branch=branch, is_active=True).first()
+        if acc is None:
+            raise ValueError("Kassa tanlang.")
+        amount = int(data.get("amount") or 0)
+        note = (str(data.get("note") or "").strip() or None)
+        pay_order(order, account=acc, amount=amount, note=note, by_user=request.user)
+    except (ValueError, DjangoValidationError) as e:
+        return JsonResponse({"error": _error_text(e)}, status=400)
+
+    return JsonResponse(_order_state(order.pk))
+
+
+@login_required
+@require_POST
+def api_order_deliver(request, pk):
+    branch, err = _api_branch(request)
+    if err:
+        return err
+    order = get_object_or_404(Order, pk=pk, branch=branch)
+
+    try:
+        mark_delivered(order, by_user=request.user)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(_order_state(order.pk))
+
+
+# =====================
+# Order hodisalari (oshxona/kassa ekranlari): qisqa poll
+# =====================
+# So'rov darhol javob qaytaradi (gunicorn sync worker'lari band bo'lib qolmasin);
+# so'rovlar oralig'ini klient belgilaydi.
+EVENTS_PAGE_SIZE = 200
+# id'lar commit tartibida emas: kichik id katta id'dan keyin commit bo'lishi mumkin.
+# Shuning uchun faqat shu soniyadan eski hodisalar beriladi — ochiq tranzaksiyadagi
+# hodisa keyinroq commit bo'lsa ham kursor uni o'tkazib yubormaydi.
+EVENTS_SETTLE_SECONDS = 2
+
+
+def _event_json(e: dict) -> dict:
+    return {
+        "id": e["id"],
+        "order": str(e["order_id"]),
+        "kind": e["kind"],
+        "created_at": e["created_at"].isoformat(),
+        **(e["data"] or {}),
+    }
+
+
+def _events_after(branch_id, after: int) -> list:
+    """id > after va EVENTS_SETTLE_SECONDS'dan eski hodisalar (id tartibida, bitta sahifa)."""
+    settled = timezone.now() - timedelta(seconds=EVENTS_SETTLE_SECONDS)
+    return list(
+        OrderEvent.objects.filter(branch_id=branch_id, id__gt=after, created_at__lte=settled)
+        .order_by("id")
+        .values("id", "order_id", "kind", "data", "created_at")[:EVENTS_PAGE_SIZE]
+    )
+
+
+@login_required
+def pos_events(request):
+    """
+    Faol filial order hodisalari (created / paid / delivered / stock_failed): ?after=<id>.
+
+    Kutmaydi — bor hodisalarni darhol qaytaradi: {"events": [...], "last_id"};
+    keyingi so'rovda after=last_id. Hodisalar ~EVENTS_SETTLE_SECONDS kechikish bilan keladi.
+    after berilmasa — faqat joriy last_id (tarix yuborilmaydi).
+    """
+    branch = get_active_branch(request)
+    if branch is None:
+        return JsonResponse({"error": "no_branch"}, status=403)
+
+    try:
+        after = int(request.GET["after"])
+    except (KeyError, ValueError):
+        settled = timezone.now() - timedelta(seconds=EVENTS_SETTLE_SECONDS)
+        last_id = (
+            OrderEvent.objects.filter(branch_id=branch.id, created_at__lte=settled)
+            .order_by("-id").values_list("id", flat=True).first()
         )
-    return JsonResponse({"branch": str(branch.id), "foods": out})
+        return JsonResponse({"events": [], "last_id": last_id or 0})
+
+    events = _events_after(branch.id, after)
+    last_id = events[-1]["id"] if events else after
+    response = JsonResponse({"events": [_event_json(e) for e in events], "last_id": last_id})
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+SYNC_MAX_ORDERS = 500
+
+
+def _uuid_or_none(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+@login_required
+@require_POST
+def pos_sync(request):
+    """
+    Offline navbatdagi orderlarni bitta so'rovda yuklash.
+
+    Body: {"orders": [{"id": "<uuid>", "items": [{"food", "qty"}], "order_type",
+                       "note", "is_delivered", "payment": {"account_id", "amount"}}]}
+    Har bir order alohida tranzaksiyada; javobda har biri uchun natija.
+    """
+    try:
+        branch = _require_branch(request)
+    except LookupError:
+        return JsonResponse({"error": "branch_not_selected"}, status=400)
+    except PermissionError:
+        return JsonResponse({"error": "no_branch"}, status=403)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        orders = payload.get("orders")
+        if not isinstance(orders, list):
+            raise ValueError
+    except Exception:
+        return JsonResponse({"error": "invalid_payload"}, status=400)
+
+    if len(orders) > SYNC_MAX_ORDERS:
+        return JsonResponse({"error": f"max {SYNC_MAX_ORDERS} orders"}, status=400)
+
+    results = []
+    for data in orders:
+        data = data if isinstance(data, dict) else {}
+        try:
+            order, created = apply_offline_order(branch, data, by_user=request.user)
+        except IntegrityError:
+            # parallel sync shu id'ni allaqachon yozgan bo'lsa — "exists"; boshqa buzilish — 500
+            order = Order.objects.filter(pk=_uuid_or_none(data.get("id")), branch=branch).first()
+            if order is None:
+                raise
+            created = False
+        except (ValueError, DjangoValidationError) as e:
+            results.append({"id": data.get("id"), "result": "error", "error": _error_text(e)})
+            continue
+
+        results.append(
+            {
+                "id": str(order.id),
+                "result": "created" if created else "exists",
+                "status": order.status,
+                "is_delivered": order.is_delivered,
+                "total_amount": int(order.total_amount),
+                "paid_amount": int(order.paid_amount),
+            }
+        )
+
+    return JsonResponse({"results": results})
 
 
 """Note: order finalize alohida view kerak emas.